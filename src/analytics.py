@@ -0,0 +1,206 @@
+import os  # OS Util funcs
+import csv  # CSV export
+import json  # JSON
+import time  # Timing
+import hashlib  # archive identity
+import argparse  # Command parser
+
+import numpy as np
+
+import tickrec
+from replay import find_recordings
+
+CACHE_DIR = "archive"  # columnar copy of the last archive loaded, memory-mapped on the next load
+BIN = 1.  # s, width of the tick-rate curve bins
+HORIZON = 60.  # s after the entry covered by the tick-rate curve
+
+
+def archive_key(paths):
+    """ Identity of a set of recordings: their paths, sizes and mtimes. """
+
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_columns(path):
+    """ (timestamps in ms, prices) of a tick recording (memory-mapped) or of a `<ms>.csv` price history. """
+
+    if path.endswith(".ticks"):
+        ticks = tickrec.read(path)
+        return ticks["timestamp"], ticks["price"]
+    data = np.loadtxt(path, delimiter=",", ndmin=2, dtype=np.float64, usecols=(0, 1))
+    return data[:, 0].astype(np.int64), data[:, 1]
+
+
+class Archive:
+    """
+        Every run of an archive of recordings in one columnar structure: the ticks of
+        all runs back to back in flat `timestamps` and `prices` arrays, run i spanning
+        `offsets[i]:offsets[i + 1]`.
+
+        Per-run metrics are computed for all runs at once with segmented reductions
+        (`reduceat`, `bincount`) instead of a Python loop per run. The structure is
+        saved as .npy files and memory-mapped on the next load of the same archive,
+        so only the pages a computation touches are read in.
+    """
+
+    def __init__(self, names, timestamps, prices, offsets):
+        self.names = names
+        self.timestamps = timestamps  # ms
+        self.prices = prices
+        self.offsets = offsets  # len(names) + 1
+        self.starts = offsets[:-1]
+        self.lengths = np.diff(offsets)
+        self.run = np.repeat(np.arange(len(names)), self.lengths)  # run of every tick
+
+    @classmethod
+    def build(cls, paths):
+        """ Read recordings into flat arrays. Empty recordings are left out. """
+
+        names, columns = [], []
+        for path in paths:
+            timestamps, prices = read_columns(path)
+            if len(prices):
+                names.append(path)
+                columns.append((timestamps, prices))
+        offsets = np.zeros(len(columns) + 1, dtype=np.int64)
+        np.cumsum([len(prices) for _, prices in columns], out=offsets[1:])
+        timestamps = np.empty(offsets[-1], dtype=np.int64)
+        prices = np.empty(offsets[-1], dtype=np.float64)
+        for (start, end), (run_timestamps, run_prices) in zip(zip(offsets[:-1], offsets[1:]), columns):
+            timestamps[start:end] = run_timestamps
+            prices[start:end] = run_prices
+        return cls(names, timestamps, prices, offsets)
+
+    @classmethod
+    def load(cls, paths, cache=CACHE_DIR):
+        """
+            Archive of the recordings in `paths` (files or directories). Memory-mapped from
+            `cache` when it holds this very set of recordings, otherwise built and cached.
+        """
+        files = find_recordings(paths)
+        key = archive_key(files)
+        index_path = os.path.join(cache, "index.json") if cache else None
+        if index_path and os.path.exists(index_path):
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+            if index["key"] == key:
+                return cls(index["names"], *(np.load(os.path.join(cache, f"{name}.npy"), mmap_mode='r')
+                                             for name in ("timestamps", "prices", "offsets")))
+
+        archive = cls.build(files)
+        if cache:
+            archive.save(cache, key)
+        return archive
+
+    def save(self, cache, key):
+        os.makedirs(cache, exist_ok=True)
+        for name in ("timestamps", "prices", "offsets"):
+            np.save(os.path.join(cache, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(cache, "index.json"), 'w') as f:
+            json.dump({"key": key, "names": self.names}, f)  # written last, marks the arrays complete
+
+    def __len__(self):
+        return len(self.names)
+
+    def metrics(self):
+        """
+            Per-run metrics, as columns over the runs. The first tick of a run is its entry.
+
+            :return: {"entry", "peak_ratio", "time_to_peak" (s), "drawdown" (largest fall from a
+                running high, as a ratio), "low_ratio", "final_ratio", "duration" (s), "ticks"}
+        """
+        starts, run = self.starts, self.run
+        entry = np.asarray(self.prices[starts])
+        ratio = self.prices / entry[run]
+        elapsed = (self.timestamps - self.timestamps[starts][run]) / 1000  # s since the entry
+
+        peak = np.maximum.reduceat(ratio, starts)
+        ticks = np.arange(len(ratio))
+        peak_tick = np.minimum.reduceat(np.where(ratio == peak[run], ticks, len(ratio)), starts)
+
+        # segmented running high: lift every run above all the previous ones, so one
+        # accumulate over the flat array never carries a high across runs
+        lift = float(peak.max() - np.minimum.reduceat(ratio, starts).min()) + 1
+        high = np.maximum.accumulate(ratio + run * lift) - run * lift
+        drawdown = np.maximum.reduceat(1 - ratio / high, starts)
+
+        return {
+            "entry": entry,
+            "peak_ratio": peak,
+            "time_to_peak": elapsed[peak_tick],
+            "drawdown": drawdown,
+            "low_ratio": np.minimum.reduceat(ratio, starts),
+            "final_ratio": ratio[self.offsets[1:] - 1],
+            "duration": elapsed[self.offsets[1:] - 1],
+            "ticks": self.lengths,
+        }
+
+    def tick_rate(self, bin=BIN, horizon=HORIZON):
+        """ Ticks per second of every run in `bin` s bins over the first `horizon` s after the entry, (runs, bins). """
+
+        bins = int(np.ceil(horizon / bin))
+        elapsed = (self.timestamps - self.timestamps[self.starts][self.run]) / 1000
+        slot = (elapsed // bin).astype(np.int64)
+        inside = slot < bins
+        counts = np.bincount(self.run[inside] * bins + slot[inside], minlength=len(self) * bins)
+        return counts.reshape(len(self), bins) / bin
+
+
+def print_summary(metrics, rate, bin):
+    """ Distribution of every metric across the runs, then the tick-rate curve. """
+
+    print(f"{'metric':<14} {'mean':>10} {'p5':>10} {'p50':>10} {'p95':>10} {'max':>10}")
+    for name in ("peak_ratio", "time_to_peak", "drawdown", "low_ratio", "final_ratio", "duration", "ticks"):
+        values = metrics[name]
+        p5, p50, p95 = np.percentile(values, [5, 50, 95])
+        print(f"{name:<14} {values.mean():>10.4f} {p5:>10.4f} {p50:>10.4f} {p95:>10.4f} {values.max():>10.4f}")
+
+    curve = rate.mean(axis=0)
+    print(f"\nTick rate after the entry (ticks/s, mean over runs, {bin:g} s bins)")
+    for i in range(0, len(curve), 10):
+        print(f"{i * bin:>6g} s  " + " ".join(f"{v:6.1f}" for v in curve[i:i + 10]))
+
+
+def print_runs(archive, metrics, top, key):
+    """ The `top` runs by metric `key`. """
+
+    print(f"{'run':<32} {'ticks':>7} {'peak':>8} {'t peak s':>9} {'drawdown':>9} {'final':>8}")
+    for i in np.argsort(-metrics[key])[:top]:
+        print(f"{os.path.basename(archive.names[i]):<32} {metrics['ticks'][i]:>7} {metrics['peak_ratio'][i]:>8.4f} "
+              f"{metrics['time_to_peak'][i]:>9.2f} {metrics['drawdown'][i]:>9.4f} {metrics['final_ratio'][i]:>8.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Per-run metrics over a whole archive of recorded price histories')
+    parser.add_argument("paths", nargs="+", help="tick recordings (.ticks), price histories (<ms>.csv) or directories of them")
+    parser.add_argument("--cache", type=str, default=CACHE_DIR, required=False, help="Directory of the columnar copy of the archive, '' to disable")
+    parser.add_argument("--bin", type=float, default=BIN, required=False, help="Width of the tick-rate bins, in s")
+    parser.add_argument("--horizon", type=float, default=HORIZON, required=False, help="Seconds after the entry covered by the tick-rate curve")
+    parser.add_argument("--top", type=int, default=10, required=False, help="Number of runs to list")
+    parser.add_argument("--sort", type=str, default="peak_ratio", required=False, help="Metric to list the runs by, e.g. drawdown")
+    parser.add_argument("--csv", type=str, default=None, required=False, help="Also write the per-run metrics to this CSV file")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    archive = Archive.load(args.paths, args.cache)
+    assert len(archive), "ERROR: no recordings found"
+    t1 = time.perf_counter()
+    metrics = archive.metrics()
+    rate = archive.tick_rate(args.bin, args.horizon)
+    t2 = time.perf_counter()
+    print(f"{len(archive)} runs, {len(archive.prices)} ticks: loaded in {t1 - t0:.3f} s, analysed in {t2 - t1:.3f} s\n")
+
+    print_summary(metrics, rate, args.bin)
+    print()
+    print_runs(archive, metrics, args.top, args.sort)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["run"] + list(metrics))
+            writer.writerows(zip(archive.names, *(metrics[name].tolist() for name in metrics)))
+        print(f"Generated '{args.csv}'")
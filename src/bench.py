@@ -0,0 +1,470 @@
+import io  # stdout sink
+import json  # JSON
+import os  # OS Util funcs
+import math  # floor
+import time  # Timing
+import sys  # interpreter path
+import random  # trigger jitter
+import asyncio  # event loop
+import argparse  # Command parser
+import tempfile  # scratch directory for files the scripts write
+import contextlib  # stdout redirection
+import subprocess  # fresh interpreters for the startup benchmark
+
+import requests
+from binance.client import Client
+
+import pymp
+import pympA
+import exitrules
+import tickrec
+import tickstore
+import orderbook
+import ordertemplate
+import fixedpoint
+from engine import Engine
+from journal import Journal, LogSink
+from ingest import TickerFilter
+from mockexchange import MockExchange, MockClient, MockOrderTemplate
+from symbolcache import SymbolCache
+from symbolindex import SymbolIndex
+
+QUOTE_ASSET = "BTC"
+BASE_ASSET = "PUMP"  # coin "typed" at the prompt
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))  # benchmarks run in a scratch directory
+# entry point -> modules it loads before it is ready for input, what is only needed after it is warmed up meanwhile
+ENTRY_POINTS = {
+    "pymp.py": ("binance.client", "connpool", "clocksync", "userdata", "ordertemplate", "websockets"),
+    "pympA.py": ("binance.client", "connpool", "clocksync", "userdata", "ordertemplate", "websockets"),
+    "session.py": ("binance.client", "connpool", "clocksync", "websockets"),
+    "daemon.py": ("binance.client", "connpool", "clocksync", "websockets", "tickstore"),
+    "pympctl.py": (),
+}
+
+BENCHMARKS = {}  # name -> benchmark function
+
+
+def benchmark(name):
+    """ Register a benchmark under `name`. It receives the parsed args and returns {stage: [ns samples]}. """
+
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def percentile(samples, pct):
+    """ Nearest-rank percentile of a list of samples. """
+
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def report(name, results):
+    """ Print p50/p99 of every stage of a benchmark, in ms. """
+
+    for stage, samples in results.items():
+        if not samples:
+            print(f"{name:<10} {stage:<28} {'-':>6}")
+            continue
+        p50 = percentile(samples, 50) / 1e6
+        p99 = percentile(samples, 99) / 1e6
+        print(f"{name:<10} {stage:<28} {len(samples):>6} {p50:>10.4f} {p99:>10.4f}")
+
+
+def make_exchange(args, **kwargs):
+    """ Build a mock exchange with a single pumpable symbol and enough quote asset to buy it. """
+
+    exchange = MockExchange(latency_ms=args.latency, jitter_ms=args.jitter, seed=args.seed, **kwargs)
+    for i in range(1500):  # roughly the size of the real exchange info
+        exchange.add_symbol(f"C{i:04d}")
+    exchange.add_symbol(BASE_ASSET)
+    exchange.balances[QUOTE_ASSET] = 1e6
+    return exchange
+
+
+def order_stages(exchange, t_input, results):
+    """ Split the last order of the exchange into input-to-order-sent and round-trip samples. """
+
+    record = exchange.orders[-1]
+    results["input-to-order-sent"].append(record["sent"] - t_input)
+    results["order-round-trip"].append(record["responded"] - record["sent"])
+
+
+async def time_buys(buy, validate, exchange, runs):
+    """ Time `runs` coin inputs: `validate` stands in for the prompt loop, `buy` is the script's buy coroutine. """
+
+    results = {"input-to-order-sent": [], "order-round-trip": []}
+    for _ in range(runs):
+        t_input = time.perf_counter_ns()
+        validate()
+        await buy()
+        order_stages(exchange, t_input, results)
+    return results
+
+
+@benchmark("buy")
+def bench_buy(args):
+    """ Coin input to market buy, through the buy coroutine of each entry point. """
+
+    exchange = make_exchange(args)
+    client = MockClient(exchange)
+    symbols = SymbolCache.download(client, path=None)
+    symbol = f"{BASE_ASSET}{QUOTE_ASSET}"
+
+    # pymp.py: validate against the symbol index, then fire the buy template
+    index = SymbolIndex.from_cache(symbols)
+    pymp.client, pymp.symbols, pymp.symbol, pymp.base_asset = client, symbols, symbol, BASE_ASSET
+    pymp.quote, pymp.pump_buy_t0 = 0.01, pymp.now()
+    pymp.buy_template = ordertemplate.market_buy(client, pymp.quote, template=MockOrderTemplate)
+
+    def pymp_validate():
+        if index.lookup(BASE_ASSET.lower().strip().upper(), QUOTE_ASSET) is None:
+            raise AssertionError(BASE_ASSET)
+
+    # pympA.py: validate against the symbol index and fetch symbol info from the cache, then fire the buy template
+    pympA.client, pympA.symbols, pympA.symbol, pympA.coin = client, symbols, symbol, BASE_ASSET
+    pympA.pump_btc = 0.01
+    pympA.buy_template = ordertemplate.market_buy(client, pympA.pump_btc, template=MockOrderTemplate)
+    pympA.journal = Journal(script="bench")
+
+    def pympA_validate():
+        if index.lookup(BASE_ASSET.lower().upper().strip(), "BTC") is None:
+            raise AssertionError(BASE_ASSET)
+        symbols.get(symbol)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(time_buys(pymp.buy, pymp_validate, exchange, args.runs))
+        resultsA = asyncio.run(time_buys(pympA.buy, pympA_validate, exchange, args.runs))
+    pympA.journal.close()
+
+    return {f"pymp {k}": v for k, v in results.items()} | {f"pympA {k}": v for k, v in resultsA.items()}
+
+
+async def time_decisions(on_tick, reset, exchange, symbol, runs, rng):
+    """
+        Push a triggering ticker message at a random time into an engine watching with
+        `on_tick`, and time how long after the message the sell decision is made.
+    """
+    loop = asyncio.get_running_loop()
+    samples = []
+    for _ in range(runs):
+        reset()
+        queue = asyncio.Queue()
+
+        async def stream():
+            while True:
+                yield await queue.get()
+
+        engine = Engine(stream()).start()
+        loop.call_later(rng.uniform(0, 0.01), lambda: queue.put_nowait(exchange.ticker(symbol)))
+        await engine.watch(on_tick, time.time() + 10)
+        samples.append(time.perf_counter_ns() - exchange.ticks[symbol])
+        await engine.close()
+    return samples
+
+
+@benchmark("sell")
+def bench_sell(args):
+    """ Triggering ticker message to sell decision, through the engine and the tick handler of each entry point. """
+
+    exchange = make_exchange(args, volatility=0.)  # ticks repeat the price they are pushed at
+    symbol = f"{BASE_ASSET}{QUOTE_ASSET}"
+    buy_price = exchange.prices[symbol]
+    exchange.prices[symbol] = buy_price * 2  # every tick triggers the sell
+    rng = random.Random(args.seed)
+
+    # pymp.py: sell factor of 1.5
+    pymp.ticks = pympA.ticks = tickstore.TickBuffer()
+    pymp.order_buy_price = buy_price
+    pymp.recorder = tickrec.TickRecorder("bench.ticks")
+    pymp.rules = exitrules.ExitRules([exitrules.TakeProfit(1.5)])
+
+    def pymp_reset():
+        pymp.rules.start(buy_price, time.time())
+
+    # pympA.py: percentage increase of 50%
+    pympA.buy_price = buy_price
+    pympA.rules = exitrules.ExitRules([exitrules.TakeProfit(1.5)])
+    pympA.log = PrintLog()
+
+    def pympA_reset():
+        pympA.cur_price = 0
+        pympA.rules.start(buy_price, time.time())
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(time_decisions(pymp.fetch_price, pymp_reset, exchange, symbol, args.runs, rng))
+        resultsA = asyncio.run(time_decisions(pympA.update_price, pympA_reset, exchange, symbol, args.runs, rng))
+    pymp.recorder.close()
+
+    return {"pymp tick-to-sell-decision": results, "pympA tick-to-sell-decision": resultsA}
+
+
+class PrintLog:
+    """ Synchronous stand-in for `journal.LogSink`: a print on the tick path, like pympA.py did. """
+
+    def log(self, fmt, *args):
+        print(fmt % args)
+
+
+@benchmark("ingest")
+def bench_ingest(args):
+    """
+        Raw ticker frames through decoding and the tick handler of each entry point: full
+        `json.loads` against `ingest.TickerFilter`, and for pympA prints against the background sink.
+    """
+    symbol = f"{BASE_ASSET}{QUOTE_ASSET}"
+    if args.frames:
+        with open(args.frames, 'r') as f:
+            frames = [line.strip() for line in f if line.strip()]
+    else:
+        exchange = make_exchange(args, volatility=0.0001)  # about a third of the prices repeat at 8 decimals
+        frames = [exchange.ticker_frame(symbol) for _ in range(args.runs)]
+
+    # handlers that never sell
+    pymp.ticks = pympA.ticks = tickstore.TickBuffer()
+    pymp.order_buy_price = pympA.buy_price = float(json.loads(frames[0])["c"])
+    pymp.recorder = tickrec.TickRecorder("ingest.ticks")
+    pymp.rules = exitrules.ExitRules([exitrules.TakeProfit(1e9)])
+    pympA.rules = exitrules.ExitRules([exitrules.TakeProfit(1e9)])
+    pymp.rules.start(pymp.order_buy_price, time.time())
+    pympA.rules.start(pympA.buy_price, time.time())
+
+    results, lines = {}, []
+    with contextlib.redirect_stdout(io.StringIO()):
+        cases = {
+            "pymp json.loads": (json.loads, pymp.fetch_price, None),
+            "pymp TickerFilter": (TickerFilter(("E", "c", "b", "a", "v", "Q")), pymp.fetch_price, None),
+            "pympA json.loads + print": (json.loads, pympA.update_price, PrintLog()),
+            "pympA TickerFilter + LogSink": (TickerFilter(), pympA.update_price, LogSink()),
+        }
+        for name, (decode, on_tick, log) in cases.items():
+            pympA.log, pympA.cur_price, pymp.order_last_price = log, 0, None
+            samples = []
+            cpu0, t0 = time.thread_time_ns(), time.perf_counter_ns()
+            for frame in frames:
+                t = time.perf_counter_ns()
+                msg = decode(frame)
+                if msg is not None:
+                    on_tick(msg)
+                samples.append(time.perf_counter_ns() - t)
+            wall, cpu = time.perf_counter_ns() - t0, time.thread_time_ns() - cpu0
+            if isinstance(log, LogSink):
+                log.close()
+            results[name] = samples
+            lines.append(f"{'ingest':<10} {name:<28} {len(frames) / wall * 1e9:>9.0f} msgs/s, "
+                         f"{cpu / len(frames) / 1000:.2f} us handler thread CPU per message")
+    pymp.recorder.close()
+    print("\n".join(lines))
+    return results
+
+
+@benchmark("book")
+def bench_book(args):
+    """ Diff update and pre-trade fill estimates on a 1000 level book. """
+
+    exchange = make_exchange(args)
+    symbol = f"{BASE_ASSET}{QUOTE_ASSET}"
+    book = orderbook.OrderBook(symbol)
+    book.load(exchange.depth(symbol, orderbook.DEPTH_LIMIT))
+    events = [exchange.depth_update(symbol) for _ in range(args.runs)]
+    best_ask = book.asks.best()
+
+    results = {"diff-update": [], "estimate-buy": [], "estimate-sell": []}
+    for event in events:
+        t0 = time.perf_counter_ns()
+        book.apply(event)
+        t1 = time.perf_counter_ns()
+        book.estimate_buy(best_ask * 5000)  # a few levels deep
+        t2 = time.perf_counter_ns()
+        book.estimate_sell(5000)
+        t3 = time.perf_counter_ns()
+        results["diff-update"].append(t1 - t0)
+        results["estimate-buy"].append(t2 - t1)
+        results["estimate-sell"].append(t3 - t2)
+    return results
+
+
+@benchmark("fills")
+def bench_fills(args):
+    """
+        Cost of exact fill totals and LOT_SIZE rounding: fixed point against float, the
+        same computation on both sides. Totals are read from executedQty and
+        cummulativeQuoteQty, or summed over the fills as for responses without them.
+        Fixed point is not faster, CPython parses a float in C and an integer after a
+        `str.replace`; what it buys is exact totals and quantities.
+        Balances are whole steps, like a filled quantity, which is where float rounding loses a step.
+    """
+    exchange = make_exchange(args, fills=10)
+    symbol = f"{BASE_ASSET}{QUOTE_ASSET}"
+    orders = [exchange.place_market_order(symbol, "BUY", quote_qty=0.01) for _ in range(args.runs)]
+    fills_only = [{key: value for key, value in order.items() if key != "cummulativeQuoteQty"} for order in orders]
+    rng = random.Random(args.seed)
+    balances = [f"{rng.randrange(1, 10 ** 8) / 100:.8f}" for _ in range(args.runs)]
+    step_size = 0.01
+    precision = fixedpoint.Precision(fixedpoint.units("0.01000000"), fixedpoint.units("0.00000001"))
+
+    def float_totals(order):
+        quote = float(order["cummulativeQuoteQty"])
+        return quote, quote / float(order["executedQty"])
+
+    def float_sums(order):
+        qty = quote = 0.
+        for fill in order["fills"]:
+            fill_qty = float(fill["qty"])
+            qty += fill_qty
+            quote += float(fill["price"]) * fill_qty
+        return quote, quote / qty
+
+    def fixed(order):
+        fills = fixedpoint.Fills(order)
+        return fills.total, fills.price
+
+    pairs = {
+        "totals": (float_totals, fixed, orders),
+        "fill sums": (float_sums, fixed, fills_only),
+        "step floor": (lambda balance: float(math.floor(float(balance) * (1/step_size))) / (1/step_size),
+                       lambda balance: precision.quantity(fixedpoint.units(balance)), balances),
+    }
+    results = {f"{kind} {stage}": [] for stage in pairs for kind in ("float", "fixed-point")}
+    for stage, (float_side, fixed_side, inputs) in pairs.items():
+        for value in inputs:
+            t0 = time.perf_counter_ns()
+            float_side(value)
+            t1 = time.perf_counter_ns()
+            fixed_side(value)
+            t2 = time.perf_counter_ns()
+            results[f"float {stage}"].append(t1 - t0)
+            results[f"fixed-point {stage}"].append(t2 - t1)
+
+    lost = sum(f"{pairs['step floor'][0](balance):.2f}" != pairs['step floor'][1](balance) for balance in balances)
+    for stage in pairs:
+        slowdown = percentile(results[f"fixed-point {stage}"], 50) / percentile(results[f"float {stage}"], 50)
+        print(f"{'fills':<10} fixed point {stage}: {slowdown:.1f}x the float time (p50), once per order")
+    print(f"{'fills':<10} float step floor lost a step (or more) on {lost} of {len(balances)} balances")
+    return results
+
+
+def import_time(args):
+    """
+        Run a fresh interpreter with `-X importtime` in the source directory.
+
+        :return: ns spent importing, summed over the modules imported at the top level
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=SRC_DIR,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True).stderr
+    total = 0
+    for line in stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit() and not name.startswith("  "):  # nested imports are in the cumulative
+                total += int(cumulative) * 1000
+    return total
+
+
+@benchmark("startup")
+def bench_startup(args):
+    """
+        Startup of every entry point in fresh interpreters: `-h` end to end, what `-h` imports,
+        and what is imported before the entry point is ready for input.
+    """
+    results = {}
+    for script, ready in ENTRY_POINTS.items():
+        help_wall, help_imports, ready_imports = [], [], []
+        module = script[:-len(".py")]
+        for _ in range(args.spawns):
+            t0 = time.perf_counter_ns()
+            subprocess.run([sys.executable, script, "-h"], cwd=SRC_DIR, stdout=subprocess.DEVNULL, check=True)
+            help_wall.append(time.perf_counter_ns() - t0)
+            help_imports.append(import_time([script, "-h"]))
+            ready_imports.append(import_time(["-c", f"import {', '.join((module,) + ready)}"]))
+        results[f"{script} -h"] = help_wall
+        results[f"{script} -h imports"] = help_imports
+        results[f"{script} ready imports"] = ready_imports
+    return results
+
+
+class StubAdapter(requests.adapters.BaseAdapter):
+    """ Transport that answers every request with a filled order at once, stamping when it was handed the request. """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = None
+        self.content = b'{"symbol": "PUMPBTC", "orderId": 1, "status": "FILLED", "executedQty": "10", "fills": []}'
+
+    def send(self, request, **kwargs):
+        self.sent = time.perf_counter_ns()
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.content
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+class StubClient(Client):
+    """ Real python-binance `Client` whose session never leaves the process. """
+
+    def _init_session(self):
+        session = super()._init_session()
+        self.adapter = StubAdapter()
+        session.mount("https://", self.adapter)
+        return session
+
+
+@benchmark("template")
+def bench_template(args):
+    """ Order call to request handed to the transport: `Client` call path against pre-signed templates. """
+
+    client = StubClient("api-key", "secret-key")
+    symbol = f"{BASE_ASSET}{QUOTE_ASSET}"
+    buy = ordertemplate.market_buy(client, 0.01)
+    sell = ordertemplate.market_sell(client).bind(symbol=symbol, quantity=10.)
+
+    calls = {
+        "client buy": lambda: client.order_market_buy(symbol=symbol, newOrderRespType="FULL", quoteOrderQty=0.01),
+        "template buy": lambda: buy.fire(symbol=symbol),
+        "client sell": lambda: client.order_market_sell(symbol=symbol, newOrderRespType="FULL", quantity=10.),
+        "template sell (bound)": lambda: sell.fire(),
+    }
+    results = {name: [] for name in calls}
+    for _ in range(args.runs):
+        for name, order in calls.items():
+            t0 = time.perf_counter_ns()
+            order()
+            results[name].append(client.adapter.sent - t0)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Latency benchmarks against the mock exchange')
+    parser.add_argument("benchmarks", nargs="*", default=None, help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default all)")
+    parser.add_argument("--runs", type=int, default=1000, required=False, help="Samples per benchmark")
+    parser.add_argument("--latency", type=float, default=0., required=False, help="Injected exchange latency, in ms")
+    parser.add_argument("--jitter", type=float, default=0., required=False, help="Max random extra latency, in ms")
+    parser.add_argument("--seed", type=int, default=None, required=False, help="Seed for the mock exchange")
+    parser.add_argument("--frames", type=str, default=None, required=False, help="Recorded raw ticker frames, one per line, for the ingest benchmark")
+    parser.add_argument("--spawns", type=int, default=5, required=False, help="Interpreter launches per entry point for the startup benchmark")
+    parser.add_argument("--budget", type=float, default=None, required=False, help="Fail if an entry point imports more than this many ms (p50) before it is ready")
+    args = parser.parse_args()
+
+    names = args.benchmarks or list(BENCHMARKS)
+    for name in names:
+        assert name in BENCHMARKS, f"ERROR: unknown benchmark '{name}', use 'python bench.py -h' for help"
+
+    print(f"{'benchmark':<10} {'stage':<28} {'runs':>6} {'p50 ms':>10} {'p99 ms':>10}")
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)  # the scripts write their journals and recordings to the working directory
+        over_budget = []
+        for name in names:
+            results = BENCHMARKS[name](args)
+            report(name, results)
+            if name == "startup" and args.budget is not None:
+                over_budget += [stage for stage, samples in results.items()
+                                if stage.endswith("ready imports") and percentile(samples, 50) / 1e6 > args.budget]
+    assert not over_budget, f"ERROR: over the {args.budget:g} ms import budget: {', '.join(over_budget)}"
@@ -0,0 +1,93 @@
+import time  # Timing
+import threading  # background sync
+from collections import deque
+
+import requests
+
+SYNC_INTERVAL = 60  # seconds between sync bursts
+BURST = 4  # server time samples per burst
+WINDOW = 8  # most recent samples the filter picks from
+TIMEOUT = 5  # seconds
+
+
+class ClockSync:
+    """
+        Tracks the offset of the exchange clock from the local one.
+
+        Every `interval` seconds a burst of server time requests is timed. Like the
+        NTP clock filter, the offset is taken from the recent sample with the lowest
+        round trip, since it carries the least path asymmetry, and its error is at
+        most half that round trip. Requests go straight through the session so they
+        never clobber `client.response` while an order is in flight.
+    """
+
+    def __init__(self, client, interval=SYNC_INTERVAL, burst=BURST):
+        self.client = client
+        self.interval = interval
+        self.burst = burst
+        self.samples = deque(maxlen=WINDOW)  # (rtt ms, offset ms)
+        self.offset = 0.  # exchange clock minus local clock, in ms
+        self.rtt = None  # round trip of the sample the offset comes from, in ms
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def server_time(self):
+        if hasattr(self.client, "session"):
+            response = self.client.session.get(f"{self.client.API_URL}/v3/time", timeout=TIMEOUT)
+            return response.json()["serverTime"]
+        return self.client.get_server_time()["serverTime"]  # e.g. the mock client
+
+    def sample(self):
+        t0 = time.time() * 1000
+        server = self.server_time()
+        t1 = time.time() * 1000
+        self.samples.append((t1 - t0, server - (t0 + t1) / 2))
+        self.rtt, self.offset = min(self.samples)
+
+    def sync(self):
+        for _ in range(self.burst):
+            try:
+                self.sample()
+            except (requests.RequestException, ValueError, KeyError):
+                pass  # keep the previous estimate
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sync()
+
+    def start(self):
+        """ Sync once, then keep syncing in a background thread. """
+
+        self.sync()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def now(self):
+        """ Exchange time in ms, comparable with transactTime. """
+
+        return time.time() * 1000 + self.offset
+
+    def time(self):
+        """ Exchange time in s, a drop-in for `time.time`. """
+
+        return time.time() + self.offset / 1000
+
+    def attach(self, client):
+        """ Sign every request of a python-binance `Client` with the exchange time instead of the local one. """
+
+        generate_signature = client._generate_signature
+
+        def sign(data):
+            data['timestamp'] = int(self.now())  # same dict the request is sent with
+            return generate_signature(data)
+        client._generate_signature = sign
+        return client
+
+    def report(self):
+        if self.rtt is None:
+            return "Clock offset unknown, using the local clock"
+        return f"Clock offset {self.offset:+.1f} ms (+/- {self.rtt / 2:.1f} ms, RTT {self.rtt:.1f} ms)"
@@ -0,0 +1,116 @@
+import ssl  # TLS handshake probe
+import time  # Timing
+import socket  # TCP connect probe
+import threading  # keep-alive thread
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = 2  # connections kept open to the API host
+PING_INTERVAL = 20  # seconds between keep-alive pings, well below the server idle timeout
+PING_TIMEOUT = 5  # seconds
+
+
+class ConnectionManager:
+    """
+        Keeps the HTTPS connections of a `Client` session open while the bot idles.
+
+        The session gets a pool of `size` connections which are opened up front and
+        pinged every `interval` seconds, so the first order after the coin prompt
+        reuses an established TLS connection instead of paying DNS, TCP and TLS setup.
+        Pings go straight through the session, never through `Client._request`, so
+        they cannot clobber `client.response` while an order is in flight.
+    """
+
+    def __init__(self, client, size=POOL_SIZE, interval=PING_INTERVAL):
+        self.client = client
+        self.size = size
+        self.interval = interval
+        self.ping_url = f"{client.API_URL}/v3/ping"
+        self.host = urlparse(client.API_URL).hostname
+        self.stopped = threading.Event()
+        self.thread = None
+        self.timings = {}  # stage -> ms, filled in by measure()
+        self.pings = []  # round trip of every keep-alive ping, in ms
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+        client.session.mount("https://", adapter)
+
+    def ping(self, session=None):
+        """ Lightweight request (weight 1) over the pool, returns its round trip in ms. """
+
+        t0 = time.perf_counter()
+        (session or self.client.session).get(self.ping_url, timeout=PING_TIMEOUT)
+        return (time.perf_counter() - t0) * 1000
+
+    def warm(self):
+        """ Open every connection of the pool by pinging on all of them concurrently. """
+
+        threads = [threading.Thread(target=self.keepalive_ping, daemon=True) for _ in range(self.size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def keepalive_ping(self):
+        try:
+            self.pings.append(self.ping())
+        except requests.RequestException:
+            pass  # connection dropped, the next ping or the order reconnects
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.warm()
+
+    def start(self):
+        """ Warm the pool, then keep it warm in a background thread. """
+
+        self.warm()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def measure(self):
+        """
+            Split a cold request into DNS, TCP and TLS setup, and compare it with a
+            request over an established connection. Uses its own sockets and session
+            so the pool is left untouched.
+
+            :return: {stage: ms}
+        """
+        t0 = time.perf_counter()
+        address = socket.getaddrinfo(self.host, 443, type=socket.SOCK_STREAM)[0][4]
+        t1 = time.perf_counter()
+        with socket.create_connection(address[:2], timeout=PING_TIMEOUT) as sock:
+            t2 = time.perf_counter()
+            with ssl.create_default_context().wrap_socket(sock, server_hostname=self.host):
+                t3 = time.perf_counter()
+
+        with requests.Session() as session:
+            cold = self.ping(session)
+            warm = min(self.ping(session) for _ in range(3))
+
+        self.timings = {
+            "dns": (t1 - t0) * 1000,
+            "tcp": (t2 - t1) * 1000,
+            "tls": (t3 - t2) * 1000,
+            "cold request": cold,
+            "warm request": warm,
+        }
+        return self.timings
+
+    def report(self):
+        """ One line summary of what an established connection saves. """
+
+        try:
+            t = self.timings or self.measure()
+        except (OSError, requests.RequestException) as e:
+            return f"Handshake measurement failed: {e}"
+        return ("Handshake: DNS {dns:.1f} ms, TCP {tcp:.1f} ms, TLS {tls:.1f} ms. "
+                "Request: cold {cold:.1f} ms, warm {warm:.1f} ms (saves {saved:.1f} ms)").format(
+            dns=t["dns"], tcp=t["tcp"], tls=t["tls"], cold=t["cold request"], warm=t["warm request"],
+            saved=t["cold request"] - t["warm request"])
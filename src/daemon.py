@@ -0,0 +1,216 @@
+import os  # OS Util funcs
+import json  # JSON
+import stat  # socket permissions
+import asyncio  # event loop
+import argparse  # Command parser
+
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+import lazy
+import exitrules
+import latency
+import fixedpoint
+from engine import CombinedStream, call
+from symbolcache import SymbolCache
+from ratelimit import RateLimiter
+from session import SessionManager, QUOTE_ASSET, DEV_KEY_FILE, DEV_KEY_API, DEV_KEY_SECRET, WARM
+
+# heavy modules load on first use, so -h and argument errors return at once
+binance_client = lazy.module("binance.client")  # requests and dateparser
+requests = lazy.module("requests")  # loaded by the client before any request can fail
+connpool = lazy.module("connpool")
+clocksync = lazy.module("clocksync")
+
+SOCKET_PATH = "pymp.sock"  # control socket, only the owner may connect
+COMMAND_SPAN = "input->sent"  # command received to order handed to the connection
+
+
+def ms(ns):
+    return round(ns / 1e6, 3)
+
+
+class Daemon:
+    """
+        Headless front of a `SessionManager`: the client, connection pool, clock,
+        rate limiter and exchange info are warmed up once, then commands come in as
+        JSON lines over a local Unix socket instead of `input()`.
+
+        Each request is one object with a "cmd" (buy, sell, status or quit) and gets
+        one object back, {"ok": true, ...} or {"ok": false, "error": ...}. Every order
+        is traced from the moment its command line is read, and the command to order
+        latency of each is returned with the reply and kept in histograms for status.
+    """
+
+    def __init__(self, session, quote_qty, wait, exit_spec=None, reports=()):
+        self.session = session
+        self.quote_qty = quote_qty  # default amount of the quote asset per buy
+        self.wait = wait  # default deadline, in s
+        self.exit_spec = exit_spec  # default exit rules
+        self.reports = reports  # components whose report() is part of the status
+        self.histograms = {}  # interval -> latency.Histogram, this run
+        self.pending = []  # traces not persisted yet
+        self.stopped = asyncio.Event()
+        self.server = None
+
+    async def serve(self, path=SOCKET_PATH):
+        """ Serve commands on `path` until a quit command. """
+
+        if os.path.exists(path):
+            os.remove(path)  # left over by a daemon that did not exit cleanly
+        self.session.start()
+        self.server = await asyncio.start_unix_server(self.handle, path)
+        os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+        print(f"Ready. Listening on '{path}'")
+        try:
+            await self.stopped.wait()
+        finally:
+            self.server.close()
+            await self.server.wait_closed()
+            os.remove(path)
+            await self.session.close()
+
+    async def handle(self, reader, writer):
+        """ One connection: any number of requests, answered in order. """
+
+        try:
+            while not self.stopped.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                trace = latency.Trace(None)  # named by the command
+                trace.stamp(latency.INPUT)
+                try:
+                    reply = await self.dispatch(json.loads(line), trace)
+                except (AssertionError, ValueError, KeyError, TypeError, BinanceAPIException, BinanceRequestException,
+                        requests.RequestException) as e:
+                    reply = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(reply).encode('utf-8') + b"\n")
+                await writer.drain()
+                if self.pending:  # once the reply is out
+                    traces, self.pending = self.pending, []
+                    await call(latency.save, traces)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request, trace):
+        command = request["cmd"]
+        if command == "buy":
+            return await self.buy(request, trace)
+        elif command == "sell":
+            return await self.sell(request, trace)
+        elif command == "status":
+            return self.status()
+        elif command == "quit":
+            self.stopped.set()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown command '{command}'"}
+
+    def resolve(self, coin, quote_asset=None):
+        """ (base asset, quote asset, symbol or None) of a coin as typed, e.g. "doge" or "DOGE/ETH". """
+
+        index = self.session.index
+        base_asset, quote_asset = index.parse(coin, quote_asset or self.session.quote_asset)
+        return base_asset, quote_asset, index.lookup(base_asset, quote_asset)
+
+    async def buy(self, request, trace):
+        base_asset, quote_asset, symbol = self.resolve(request["coin"], request.get("quote_asset"))
+        if symbol is None:
+            return {"ok": False, "error": f"Coin ${base_asset} does not exist{self.session.index.hint(base_asset, quote_asset)}"}
+        if symbol in self.session.table:
+            return {"ok": False, "error": f"Already holding {symbol}"}
+        if "quote" not in request and quote_asset != self.session.quote_asset:
+            return {"ok": False, "error": f"Give the amount of {quote_asset} to buy {base_asset} with"}
+        rules = exitrules.parse(request.get("exit", self.exit_spec)).add(exitrules.Deadline(float(request.get("wait", self.wait))))
+        trace.name = "buy"
+        trace.stamp(latency.RESOLVED)
+
+        order = await self.session.buy(base_asset, float(request.get("quote", self.quote_qty)), rules, quote_asset, trace)
+        if order is None:
+            return {"ok": False, "error": f"Buying {symbol} failed", "latency": self.record(trace)}
+        fills = fixedpoint.Fills(order)
+        return {"ok": True, "symbol": symbol, "qty": order["executedQty"], "price": fills.price,
+                "spent": fills.total, "rules": str(rules), "latency": self.record(trace, order)}
+
+    async def sell(self, request, trace):
+        _, _, symbol = self.resolve(request["coin"], request.get("quote_asset"))
+        if symbol not in self.session.table:
+            return {"ok": False, "error": f"Not holding {request['coin'].upper()}"}
+        trace.name = "sell"
+        trace.stamp(latency.RESOLVED)
+
+        task = self.session.schedule_sell(symbol, "manual sell", trace)
+        if task is None:
+            return {"ok": False, "error": f"{symbol} is already being sold"}
+        order = await task
+        if order is None:
+            return {"ok": False, "error": f"Selling {symbol} failed, the position is kept", "latency": self.record(trace)}
+        return {"ok": True, "symbol": symbol, "qty": order["executedQty"], "proceeds": fixedpoint.Fills(order).total,
+                "latency": self.record(trace, order)}
+
+    def record(self, trace, order=None):
+        """
+            Record the intervals of an order's trace, it is persisted once the reply is out.
+
+            :return: {interval: ms}
+        """
+
+        if order is not None and "transactTime" in order:
+            trace.server_time(order["transactTime"])
+        spans = trace.intervals()
+        if latency.SENT in trace.stamps:
+            spans[f"{trace.name} {COMMAND_SPAN}"] = trace.stamps[latency.SENT] - trace.stamps[latency.INPUT]
+        for name, ns in spans.items():
+            self.histograms.setdefault(name, latency.Histogram()).record(ns)
+        self.pending.append(trace)
+        return {name: ms(ns) for name, ns in spans.items()}
+
+    def status(self):
+        return {
+            "ok": True,
+            "positions": self.session.report(),
+            "latency": {name: {"count": h.total, **{f"p{p}": ms(h.percentile(p)) for p in (50, 90, 99, 100)}}
+                        for name, h in sorted(self.histograms.items())},
+            "reports": [component.report() for component in self.reports],
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Warm up once and take commands from pympctl.py over a local socket')
+    parser.add_argument("--quote", type=float, default=None, required=True, help="default amount of the quote asset to buy each coin with")
+    parser.add_argument("--wait", type=int, default=0, required=True, help="Default time to wait between buy and sell, in seconds")
+    parser.add_argument("--exit", type=str, default=None, required=False, help=exitrules.HELP)
+    parser.add_argument("--quote_asset", type=str, default=QUOTE_ASSET, required=False, help=f"Default quote asset, e.g. BTC, ETH or USDT (default {QUOTE_ASSET})")
+    parser.add_argument("--socket", type=str, default=SOCKET_PATH, required=False, help=f"Control socket path (default {SOCKET_PATH})")
+    args = parser.parse_args()
+
+    assert args.wait != 0, "ERROR: Must specify a non zero value for --wait, use 'python daemon.py -h' for help"
+    assert os.path.exists(DEV_KEY_FILE), f"ERROR: '{DEV_KEY_FILE}' not found, run 'python pymp.py' to generate it"
+    with open(DEV_KEY_FILE, 'r') as f:
+        keys = json.loads(f.read())
+    print(f"Default exit rules: {exitrules.parse(args.exit).add(exitrules.Deadline(args.wait))}")
+
+    client = binance_client.Client(keys[DEV_KEY_API], keys[DEV_KEY_SECRET])
+    connections = connpool.ConnectionManager(client).start()
+    print(connections.report())
+    clock = clocksync.ClockSync(client).start()
+    clock.attach(client)
+    print(clock.report())
+    limiter = RateLimiter()  # orders get the request weight budget first
+    limiter.attach(client)
+    latency.instrument(client)
+    symbols = SymbolCache.load(client)
+    lazy.warm(*WARM).join()  # nothing is left to load when the first command comes in
+
+    session = SessionManager(client, symbols, CombinedStream(), clock, args.quote_asset.upper())
+    daemon = Daemon(session, args.quote, args.wait, args.exit, (connections, clock, limiter))
+    try:
+        asyncio.run(daemon.serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+    connections.stop()
+    clock.stop()
+    print(limiter.report())
+    print(session.report())
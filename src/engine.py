@@ -0,0 +1,177 @@
+import json  # JSON
+import math  # inf
+import time  # Timing
+import asyncio  # event loop
+import functools  # call binding
+
+import lazy
+from ingest import loads
+
+websockets = lazy.module("websockets")  # loaded by the first connection
+
+STREAM_URL = "wss://stream.binance.com:9443/ws/"  # raw stream endpoint
+COMBINED_URL = "wss://stream.binance.com:9443/stream"  # combined stream endpoint
+
+
+async def call(func, *args, **kwargs):
+    """
+        Run a blocking `Client` call on the default executor, so the event loop
+        keeps handling ticker messages and timers while the request is in flight.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+async def market_stream(name, url=STREAM_URL, on_connect=None, decode=loads):
+    """
+        Decoded messages of the raw stream `name` (e.g. "bnbbtc@ticker"), reconnecting whenever the socket drops.
+        Frames `decode` returns None for are dropped.
+    """
+    async for ws in websockets.connect(f"{url}{name}"):
+        if on_connect is not None:
+            on_connect()
+        try:
+            async for frame in ws:
+                msg = decode(frame)
+                if msg is not None:
+                    yield msg
+        except websockets.ConnectionClosed:
+            continue  # reconnect
+        finally:
+            await ws.close()
+
+
+def ticker_stream(symbol, url=STREAM_URL, decode=loads):
+    """ Decoded 24hr ticker messages of `symbol`, e.g. through an `ingest.TickerFilter`. """
+
+    return market_stream(f"{symbol.lower()}@ticker", url, decode=decode)
+
+
+def depth_stream(symbol, url=STREAM_URL):
+    """ Decoded diff depth events of `symbol`, every 100 ms. """
+
+    return market_stream(f"{symbol.lower()}@depth@100ms", url)
+
+
+def user_stream(listen_key, url=STREAM_URL, on_connect=None):
+    """ Decoded user data events (balances, orders) of the account that `listen_key` belongs to. """
+
+    return market_stream(listen_key, url, on_connect)
+
+
+class CombinedStream:
+    """
+        Any number of raw streams multiplexed over a single connection to the combined
+        stream endpoint.
+
+        Streams are added and dropped live with SUBSCRIBE/UNSUBSCRIBE requests, and the
+        current set is subscribed again after every reconnect. Iterating yields the
+        decoded payload of every subscribed stream; replies to the requests are dropped.
+        Binance accepts up to 1024 streams and 5 requests per second on a connection,
+        so subscriptions should be batched.
+    """
+
+    def __init__(self, url=COMBINED_URL):
+        self.url = url
+        self.names = set()  # subscribed stream names, e.g. "bnbbtc@ticker"
+        self.ws = None  # current connection, None while (re)connecting
+        self.request_id = 0
+
+    async def request(self, method, names):
+        if self.ws is None or not names:
+            return  # sent on (re)connect
+        self.request_id += 1
+        try:
+            await self.ws.send(json.dumps({"method": method, "params": names, "id": self.request_id}))
+        except websockets.ConnectionClosed:
+            pass  # the reconnect subscribes to the current set
+
+    async def subscribe(self, *names):
+        names = [name for name in names if name not in self.names]
+        self.names.update(names)
+        await self.request("SUBSCRIBE", names)
+
+    async def unsubscribe(self, *names):
+        names = [name for name in names if name in self.names]
+        self.names.difference_update(names)
+        await self.request("UNSUBSCRIBE", names)
+
+    async def __aiter__(self):
+        async for ws in websockets.connect(self.url):
+            self.ws = ws
+            try:
+                await self.request("SUBSCRIBE", sorted(self.names))
+                async for frame in ws:
+                    msg = loads(frame)
+                    if "stream" in msg:
+                        yield msg["data"]
+            except websockets.ConnectionClosed:
+                continue  # reconnect
+            finally:
+                self.ws = None
+                await ws.close()
+
+
+class Engine:
+    """
+        Event loop side of a pump: ticker messages, the sell deadline and orders all
+        run as coroutines on one asyncio loop.
+
+        Every message is handed to a tick handler the moment it arrives. The handler
+        returns a reason to sell (any truthy value) or None to keep holding; the
+        deadline is a loop timer. There is no polling interval and no lock, whichever
+        of the two fires first ends the watch.
+    """
+
+    def __init__(self, stream, clock=None):
+        self.stream = stream  # async iterable of decoded ticker messages
+        self.time = clock.time if clock is not None else time.time  # clock the deadlines are on
+        self.queue = asyncio.Queue()  # messages received but not yet handled
+        self.reader = None
+
+    def start(self):
+        """ Start consuming the stream, e.g. while the buy order is in flight. Must be called inside the loop. """
+
+        if self.reader is None:
+            self.reader = asyncio.create_task(self.read())
+        return self
+
+    async def read(self):
+        async for msg in self.stream:
+            self.queue.put_nowait(msg)
+
+    async def handle(self, on_tick, since):
+        while True:
+            msg = await self.queue.get()
+            if msg.get("e") == "error" or msg.get("E", since) < since:
+                continue
+            reason = on_tick(msg)
+            if reason:
+                return reason
+
+    async def watch(self, on_tick, deadline, expiry="timer expiry", since=0):
+        """
+            Feed ticker messages to `on_tick` until it returns a reason to sell, or
+            until `deadline` (seconds since epoch on the engine's clock, inf for none)
+            passes. Messages queued since `start` with an event time before `since`
+            (ms, e.g. the fill time of the buy) are dropped, they predate the entry.
+
+            :return: the reason returned by `on_tick`, or `expiry` at the deadline
+        """
+        self.start()
+        timeout = None if math.isinf(deadline) else max(0., deadline - self.time())
+        try:
+            return await asyncio.wait_for(self.handle(on_tick, since), timeout)
+        except asyncio.TimeoutError:
+            return expiry
+
+    async def close(self):
+        """ Stop consuming the stream and close its socket. """
+
+        if self.reader is not None:
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+            self.reader = None
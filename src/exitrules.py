@@ -0,0 +1,137 @@
+import os  # OS Util funcs
+import json  # JSON
+import math  # inf
+
+HELP = ("Exit rules, comma separated key=value pairs or a JSON file of them: "
+        "tp=<sell price/buy price>, trail=<percent below running max>, deadline=<s after buy>, dd=<percent below buy price>")
+
+
+class Rule:
+    """
+        Exit condition evaluated incrementally on every tick.
+
+        `start` is called once with the entry price and time, `update` with every new
+        price and returns a reason to exit, or None to keep holding. Both are O(1).
+    """
+    key = None  # name of the rule in a spec
+
+    def __init__(self, value):
+        self.value = float(value)
+
+    def start(self, price, t):
+        pass
+
+    def update(self, price, t):
+        return None
+
+    def __repr__(self):
+        return f"{self.key}={self.value:g}"
+
+
+class TakeProfit(Rule):
+    """ Exit once the price reaches `value` times the entry price. """
+    key = "tp"
+
+    def start(self, price, t):
+        self.target = price * self.value
+
+    def update(self, price, t):
+        if price >= self.target:
+            return "take profit reached"
+
+
+class TrailingStop(Rule):
+    """ Exit once the price falls `value`% below its running max since entry. """
+    key = "trail"
+
+    def start(self, price, t):
+        self.peak = price
+        self.stop = price * (1 - self.value / 100)
+
+    def update(self, price, t):
+        if price > self.peak:
+            self.peak = price
+            self.stop = price * (1 - self.value / 100)
+        elif price <= self.stop:
+            return "trailing stop hit"
+
+
+class Deadline(Rule):
+    """ Exit `value` seconds after entry. The engine also schedules a timer for it, so no tick is needed. """
+    key = "deadline"
+    reason = "timer expiry"
+
+    def start(self, price, t):
+        self.at = t + self.value
+
+    def update(self, price, t):
+        if t >= self.at:
+            return self.reason
+
+
+class MaxDrawdown(Rule):
+    """ Exit once the price falls `value`% below the entry price. """
+    key = "dd"
+
+    def start(self, price, t):
+        self.floor = price * (1 - self.value / 100)
+
+    def update(self, price, t):
+        if price <= self.floor:
+            return "max drawdown hit"
+
+
+RULES = {rule.key: rule for rule in (TakeProfit, TrailingStop, Deadline, MaxDrawdown)}
+
+
+class ExitRules:
+    """ Rules composed with OR: the first rule returning a reason on a tick ends the position. """
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.deadline = math.inf  # earliest Deadline rule, in s since epoch, known after start()
+
+    def add(self, rule):
+        self.rules.append(rule)
+        return self
+
+    def start(self, price, t):
+        """ Arm every rule at the entry `price` and time `t` (s since epoch). """
+
+        for rule in self.rules:
+            rule.start(price, t)
+        self.deadline = min((rule.at for rule in self.rules if isinstance(rule, Deadline)), default=math.inf)
+
+    def update(self, price, t):
+        """ Feed a tick to every rule, returns the reason of the first one that triggers. """
+
+        for rule in self.rules:
+            reason = rule.update(price, t)
+            if reason:
+                return reason
+
+    def __repr__(self):
+        return ", ".join(map(repr, self.rules)) or "none"
+
+
+def parse(spec):
+    """
+        Build exit rules from a spec, e.g. "tp=1.5,trail=5,deadline=30", or from the
+        path of a JSON file holding an object such as {"tp": 1.5, "trail": 5}.
+
+        :return: ExitRules
+    """
+    rules = ExitRules()
+    if not spec:
+        return rules
+
+    if os.path.exists(spec):
+        with open(spec, 'r') as f:
+            pairs = json.load(f).items()
+    else:
+        pairs = [pair.split("=", 1) for pair in spec.split(",") if pair.strip()]
+
+    for pair in pairs:
+        assert len(pair) == 2 and pair[0].strip() in RULES, f"ERROR: invalid exit rule '{'='.join(map(str, pair))}'. {HELP}"
+        rules.add(RULES[pair[0].strip()](pair[1]))
+    return rules
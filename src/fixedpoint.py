@@ -0,0 +1,131 @@
+DECIMALS = 8  # the exchange sends prices and quantities with 8 decimals
+SCALE = 10 ** DECIMALS  # units per whole coin
+SCALE2 = SCALE * SCALE  # units of a price times a quantity
+
+
+def units(text):
+    """
+        Exact integer units (1e-8) of a decimal string such as "0.00012340". About three
+        times the cost of `float(text)`, so it is kept to orders and balances, off the tick path.
+    """
+
+    if len(text) > DECIMALS and text[-DECIMALS - 1] == ".":
+        return int(text.replace(".", ""))  # what the exchange sends, a single parse
+    if text.startswith("-"):
+        return -units(text[1:])  # e.g. a balanceUpdate delta
+    whole, _, frac = text.partition(".")
+    return int(whole or "0") * SCALE + int(frac[:DECIMALS].ljust(DECIMALS, "0"))
+
+
+def from_float(value):
+    """ Units of a float holding a value with at most 8 decimals, e.g. a balance. """
+
+    return round(value * SCALE)
+
+
+def to_float(value):
+    return value / SCALE
+
+
+def to_str(value, decimals=DECIMALS):
+    """ Decimal string of `value` units with `decimals` decimals, cut (not rounded). """
+
+    whole, frac = divmod(value, SCALE)
+    if not decimals:
+        return str(whole)
+    return f"{whole}.{frac:0{DECIMALS}d}"[:len(str(whole)) + 1 + decimals]
+
+
+def decimals(step):
+    """ Decimals needed to write multiples of `step` units, e.g. 2 for a step of 0.01. """
+
+    text = f"{step:0{DECIMALS}d}"[-DECIMALS:]
+    return len(text.rstrip("0"))
+
+
+class Fills:
+    """
+        Totals of a filled order in integer units, parsed once from the response.
+
+        The exchange's own `executedQty` and `cummulativeQuoteQty` give the totals with
+        two parses whatever the number of fills, the fills are only summed up for
+        responses without them. The quote total is kept in units of 1e-16 (price units
+        times quantity units) so sums of price * qty are exact too.
+    """
+
+    __slots__ = ("order", "qty", "quote", "count")
+
+    def __init__(self, order):
+        self.order = order
+        fills = order.get("fills", ())
+        self.count = len(fills)
+        if "cummulativeQuoteQty" in order:
+            self.qty = units(order["executedQty"])
+            self.quote = units(order["cummulativeQuoteQty"]) * SCALE
+        else:
+            self.qty = self.quote = 0
+            for fill in fills:
+                qty = units(fill["qty"])
+                self.qty += qty
+                self.quote += units(fill["price"]) * qty
+
+    def commission(self, asset):
+        """ Units of `asset` paid as commission. """
+
+        return sum(units(fill["commission"]) for fill in self.order.get("fills", ()) if fill.get("commissionAsset") == asset)
+
+    @property
+    def vwap(self):
+        """ Weighted average price in units, rounded half up. """
+
+        return (2 * self.quote + self.qty) // (2 * self.qty) if self.qty else 0
+
+    @property
+    def total(self):
+        """ Quote asset spent or received. """
+
+        return self.quote / SCALE2
+
+    @property
+    def price(self):
+        """ Weighted average price. """
+
+        return self.quote / (self.qty * SCALE) if self.qty else 0.
+
+    @property
+    def executed(self):
+        return self.qty / SCALE
+
+
+class Precision:
+    """ LOT_SIZE step and PRICE_FILTER tick of a symbol in units, for exact rounding of what is sent. """
+
+    __slots__ = ("step", "tick", "qty_decimals", "price_decimals")
+
+    def __init__(self, step, tick):
+        self.step = step
+        self.tick = tick
+        self.qty_decimals = decimals(step)
+        self.price_decimals = decimals(tick)
+
+    @classmethod
+    def of(cls, symbols, symbol):
+        """ Precision of `symbol` from the filters of a `SymbolCache`. """
+
+        return cls(units(symbols.get_filter(symbol, "LOT_SIZE")["stepSize"]),
+                   units(symbols.get_filter(symbol, "PRICE_FILTER")["tickSize"]))
+
+    def floor_qty(self, qty):
+        """ Largest multiple of the step not above `qty` units. """
+
+        return qty - qty % self.step
+
+    def quantity(self, qty):
+        """ LOT_SIZE valid quantity string for `qty` units, floored to the step. """
+
+        return to_str(self.floor_qty(qty), self.qty_decimals)
+
+    def price(self, price):
+        """ PRICE_FILTER valid price string for `price` units, floored to the tick. """
+
+        return to_str(price - price % self.tick, self.price_decimals)
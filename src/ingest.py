@@ -0,0 +1,51 @@
+import json  # JSON
+
+try:
+    import orjson  # optional, decodes whole frames several times faster than json
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+TICKER_FIELDS = ("E", "c", "Q")  # event time, last price, last quantity: all a tick handler reads
+
+
+class TickerFilter:
+    """
+        Decoder of raw 24hr ticker frames that only cuts out the fields a tick handler
+        reads, instead of decoding the ~20 fields of every frame.
+
+        Ticker frames are flat objects with unique keys, so each field is found with
+        a `str.find` of its key and sliced out up to the closing quote. Any other frame
+        (errors, replies) is decoded in full. No frame is dropped: the rolling statistics
+        and the recording need every tick, and the tick handlers skip an unchanged price
+        themselves before the exit rules.
+
+        Fields come out as the strings (or integers, for "E") of the decoded message,
+        so handlers work the same on either.
+    """
+
+    def __init__(self, fields=TICKER_FIELDS):
+        self.fields = fields
+        self.price_key = '"c":"'
+        # key pattern and whether the value is quoted, in frame order
+        self.keys = [(f'"{key}":"', key, True) if key != "E" else ('"E":', key, False) for key in fields if key != "c"]
+
+    def __call__(self, frame):
+        """ {field: value} of a ticker frame. """
+
+        i = frame.find(self.price_key)
+        if i < 0:
+            return loads(frame)
+        i += 5
+        msg = {"e": "24hrTicker", "c": frame[i:frame.index('"', i)]}
+        for pattern, key, quoted in self.keys:
+            j = frame.find(pattern)
+            if j < 0:
+                continue
+            j += len(pattern)
+            if quoted:
+                msg[key] = frame[j:frame.index('"', j)]
+            else:
+                end = frame.find(',', j)
+                msg[key] = int(frame[j:end if end >= 0 else frame.index('}', j)])
+        return msg
@@ -0,0 +1,170 @@
+import os  # OS Util funcs
+import sys  # stdout
+import glob  # run discovery
+import time  # Timing
+import json  # JSON
+import queue  # writer queue
+import argparse  # Command parser
+import threading  # background writer
+
+import fixedpoint
+
+JOURNAL_DIR = "journal"  # one <run id>.jsonl file per run
+
+
+class Journal:
+    """
+        Per-run event log written by a background thread.
+
+        `log` only stamps the event with the monotonic clock and puts it on a queue,
+        so the caller never waits on JSON encoding or the disk. The writer appends one
+        compact JSON line per event, {"t": ns since the run started, "e": event, ...},
+        and flushes whenever it has caught up with the queue. The first line of a run
+        carries its wall clock start, to place the monotonic times.
+    """
+
+    def __init__(self, directory=JOURNAL_DIR, run_id=None, **meta):
+        os.makedirs(directory, exist_ok=True)
+        self.t0 = time.monotonic_ns()
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.path = os.path.join(directory, f"{self.run_id}.jsonl")
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.write, daemon=True)
+        self.thread.start()
+        self.log("run", run=self.run_id, wall=time.time(), **meta)
+
+    def log(self, event, **fields):
+        """ Journal `event` with `fields` (anything JSON serializable, not mutated afterwards). """
+
+        self.queue.put((time.monotonic_ns(), event, fields))
+
+    def write(self):
+        with open(self.path, 'a') as f:
+            while True:
+                entry = self.queue.get()
+                if entry is None:
+                    break
+                t, event, fields = entry
+                f.write(json.dumps({"t": t - self.t0, "e": event, **fields}, separators=(',', ':'), default=str))
+                f.write("\n")
+                if self.queue.empty():
+                    f.flush()
+
+    def close(self):
+        """ Write out everything logged so far and stop the writer. """
+
+        self.queue.put(None)
+        self.thread.join()
+
+
+class LogSink:
+    """
+        Log lines written by a background thread, for prints on the tick path.
+
+        `log` only queues the format string and its arguments; the writer formats them
+        (%-style), writes to `stream` and flushes whenever it has caught up with the queue.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.write, daemon=True)
+        self.thread.start()
+
+    def log(self, fmt, *args):
+        self.queue.put((fmt, args))
+
+    def write(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                break
+            fmt, args = entry
+            self.stream.write(fmt % args + "\n")
+            if self.queue.empty():
+                self.stream.flush()
+        self.stream.flush()
+
+    def close(self):
+        """ Write out everything logged so far and stop the writer. """
+
+        self.queue.put(None)
+        self.thread.join()
+
+
+def read(path):
+    """ Entries of a journal file. A line cut short by a crash is left out. """
+
+    entries = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                pass
+    return entries
+
+
+def runs(directory=JOURNAL_DIR):
+    """ Journal files of every run, oldest first. """
+
+    return sorted(glob.glob(os.path.join(directory, "*.jsonl")))
+
+
+def quote_total(order):
+    """ Quote asset of an order in exact units (1e-16), from its totals or summed over its fills. """
+
+    return fixedpoint.Fills(order).quote
+
+
+def summarize(entries):
+    """ One line summary of a run: start, script, symbol, orders and profit. """
+
+    first = entries[0] if entries else {}
+    fields = {"run": first.get("run", "?"), "script": first.get("script", "?"), "symbol": "-", "profit": "-", "reason": "-"}
+    start = first.get("wall")
+    fields["start"] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)) if start else "?"
+    spent = None
+    for entry in entries:
+        fields["symbol"] = entry.get("symbol", fields["symbol"])
+        if entry["e"] == "buy" and entry.get("order"):
+            spent = quote_total(entry["order"])
+        elif entry["e"] == "sell" and entry.get("order") and spent:
+            fields["profit"] = f"{100 * (quote_total(entry['order']) - spent) / spent:+.4f}%"
+            fields["reason"] = entry.get("reason", "-")
+    fields["duration"] = f"{entries[-1]['t'] / 1e9:.1f}" if entries else "0"
+    return fields
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='List and filter the journals of past runs')
+    parser.add_argument("runs", nargs="*", help="run ids (or unique prefixes) to print the entries of, list the runs if none")
+    parser.add_argument("--dir", type=str, default=JOURNAL_DIR, required=False, help="Journal directory")
+    parser.add_argument("--symbol", type=str, default=None, required=False, help="Only runs trading this symbol")
+    parser.add_argument("--script", type=str, default=None, required=False, help="Only runs of this script, e.g. pympA")
+    parser.add_argument("--event", type=str, default=None, required=False, help="Only these events, e.g. buy,sell")
+    args = parser.parse_args()
+
+    paths = runs(args.dir)
+    if args.runs:
+        paths = [path for path in paths if any(os.path.basename(path).startswith(run) for run in args.runs)]
+
+    events = set(args.event.split(",")) if args.event else None
+    if not args.runs:
+        print(f"{'run':<24} {'start':<20} {'script':<8} {'symbol':<12} {'secs':>7} {'profit':>10}  reason")
+    for path in paths:
+        entries = read(path)
+        summary = summarize(entries)
+        if args.symbol and summary["symbol"] != args.symbol.upper():
+            continue
+        if args.script and summary["script"] != args.script:
+            continue
+
+        if not args.runs:
+            print(f"{summary['run']:<24} {summary['start']:<20} {summary['script']:<8} {summary['symbol']:<12} "
+                  f"{summary['duration']:>7} {summary['profit']:>10}  {summary['reason']}")
+            continue
+        for entry in entries:
+            if events is None or entry["e"] in events:
+                print(f"{summary['run']} {entry['t'] / 1e6:>12.3f} ms {entry['e']:<12} "
+                      f"{json.dumps({k: v for k, v in entry.items() if k not in ('t', 'e')})}")
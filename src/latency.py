@@ -0,0 +1,220 @@
+import os  # OS Util funcs
+import time  # Timing
+import json  # JSON
+import argparse  # Command parser
+import threading  # per thread active trace
+
+HISTOGRAM_FILE = "latency-histograms.json"  # histograms persisted across runs
+SUB_BITS = 7  # values keep their top 7 bits, i.e. they are recovered to within 2%
+MAX_OFFSETS = 1000  # server clock offsets kept across runs
+
+# Hot path stages, in order. "decision" replaces "input" for sells.
+INPUT = "input"  # coin input received
+DECISION = "decision"  # exit rule triggered
+RESOLVED = "resolved"  # symbol validated and built
+SIGNED = "signed"  # request params HMAC signed
+SENT = "sent"  # request handed to the connection
+RECEIVED = "received"  # response headers received
+PARSED = "parsed"  # response JSON decoded
+FILLED = "filled"  # fill totals computed
+STAGES = (INPUT, DECISION, RESOLVED, SIGNED, SENT, RECEIVED, PARSED, FILLED)
+
+local = threading.local()  # trace of the order running on the current thread
+
+
+class Trace:
+    """ perf_counter_ns stamps of the hot path stages of one order. """
+
+    def __init__(self, name):
+        self.name = name  # "buy" or "sell"
+        self.stamps = {}  # stage -> ns
+        self.wall = {}  # stage -> wall clock ms, for the server offset
+        self.offset_ms = None  # exchange clock minus local clock
+
+    def stamp(self, stage):
+        self.stamps[stage] = time.perf_counter_ns()
+        self.wall[stage] = time.time() * 1000
+
+    def server_time(self, transact_time):
+        """ Estimate the exchange clock offset from an order's transactTime, taken halfway through the round trip. """
+
+        if SENT in self.wall and RECEIVED in self.wall:
+            self.offset_ms = transact_time - (self.wall[SENT] + self.wall[RECEIVED]) / 2
+
+    def intervals(self):
+        """ {"<name> <stage>-><stage>": ns} between consecutive stamped stages, plus the total. """
+
+        stages = [stage for stage in STAGES if stage in self.stamps]
+        spans = {f"{self.name} {a}->{b}": self.stamps[b] - self.stamps[a] for a, b in zip(stages, stages[1:])}
+        if len(stages) > 2:
+            spans[f"{self.name} {stages[0]}->{stages[-1]}"] = self.stamps[stages[-1]] - self.stamps[stages[0]]
+        return spans
+
+
+def stamp(stage):
+    """ Stamp `stage` on the trace active on this thread, if any. """
+
+    trace = getattr(local, "trace", None)
+    if trace is not None:
+        trace.stamp(stage)
+
+
+def traced(trace, func):
+    """ Wrap a `Client` call so that the request stages it goes through are stamped on `trace`. """
+
+    def call(*args, **kwargs):
+        local.trace = trace
+        try:
+            return func(*args, **kwargs)
+        finally:
+            local.trace = None
+    return call
+
+
+def instrument(client):
+    """
+        Hook the request stages of a python-binance `Client`: signing, sending,
+        receiving and decoding. Calls that are not wrapped with `traced` (such as
+        keep-alive pings) are not stamped. Call it after any adapter is mounted.
+    """
+    def after(func, stage):
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            stamp(stage)
+            return result
+        return wrapper
+
+    if hasattr(client, "_generate_signature"):
+        client._generate_signature = after(client._generate_signature, SIGNED)
+        client._handle_response = after(client._handle_response, PARSED)
+
+        adapter = client.session.get_adapter(client.API_URL)
+        send = adapter.send
+
+        def send_stamped(*args, **kwargs):
+            stamp(SENT)
+            response = send(*args, **kwargs)
+            stamp(RECEIVED)
+            return response
+        adapter.send = send_stamped
+    return client
+
+
+class Histogram:
+    """
+        HDR-style log-linear histogram of non negative integers.
+
+        A value falls in the bucket of its power of two and, inside it, in one of
+        2^(SUB_BITS - 1) linear sub-buckets, so any value is recovered within 2% while
+        the whole range of latencies fits in a few hundred counters.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = counts or {}  # index -> count
+        self.total = sum(self.counts.values())
+
+    @staticmethod
+    def index(value):
+        shift = max(0, value.bit_length() - SUB_BITS)
+        return (shift << SUB_BITS) + (value >> shift)
+
+    @staticmethod
+    def value(index):
+        """ Upper bound of the values of bucket `index`. """
+
+        shift, sub = index >> SUB_BITS, index & ((1 << SUB_BITS) - 1)
+        if shift == 0:
+            return sub
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value):
+        i = self.index(max(0, int(value)))
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.total += 1
+
+    def merge(self, other):
+        for i, count in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + count
+        self.total += other.total
+
+    def percentile(self, pct):
+        if not self.total:
+            return None
+        rank = max(1, round(pct / 100 * self.total))
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return self.value(i)
+
+    def to_json(self):
+        return {str(i): count for i, count in self.counts.items()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({int(i): count for i, count in data.items()})
+
+
+def load(path=HISTOGRAM_FILE):
+    """ (histograms by interval, server offsets in ms) persisted by previous runs. """
+
+    if not os.path.exists(path):
+        return {}, []
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {name: Histogram.from_json(h) for name, h in data["histograms"].items()}, data["offsets"]
+
+
+def save(traces, path=HISTOGRAM_FILE):
+    """ Merge the intervals and server offsets of `traces` into the persisted histograms. Off the hot path. """
+
+    histograms, offsets = load(path)
+    for trace in traces:
+        for name, ns in trace.intervals().items():
+            histograms.setdefault(name, Histogram()).record(ns)
+        if trace.offset_ms is not None:
+            offsets.append(trace.offset_ms)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"histograms": {name: h.to_json() for name, h in histograms.items()},
+                   "offsets": offsets[-MAX_OFFSETS:]}, f)
+    os.replace(tmp_path, path)
+
+
+def report(traces):
+    """ One line per interval of the traces of this run, in ms. """
+
+    return "\n".join(f"{name}: {ns / 1e6:.3f} ms" for trace in traces for name, ns in trace.intervals().items())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Print the hot path latency histograms collected across runs')
+    parser.add_argument("--file", type=str, default=HISTOGRAM_FILE, required=False, help="Histogram file")
+    parser.add_argument("--reset", action="store_true", help="Delete the collected histograms")
+    args = parser.parse_args()
+
+    if args.reset:
+        if os.path.exists(args.file):
+            os.remove(args.file)
+        print(f"Deleted '{args.file}'")
+        exit()
+
+    histograms, offsets = load(args.file)
+    if not histograms:
+        print(f"No histograms in '{args.file}' yet")
+        exit()
+
+    print(f"{'interval':<32} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    def order(name):
+        # by side, then start stage, with the total of each side first
+        side, span = name.split()
+        a, b = span.split("->")
+        return side, STAGES.index(a), -STAGES.index(b)
+
+    for name, h in sorted(histograms.items(), key=lambda item: order(item[0])):
+        p50, p90, p99, top = (h.percentile(p) / 1e6 for p in (50, 90, 99, 100))
+        print(f"{name:<32} {h.total:>6} {p50:>9.3f} {p90:>9.3f} {p99:>9.3f} {top:>9.3f}")
+    if offsets:
+        print(f"\nServer clock offset over {len(offsets)} orders: mean {sum(offsets) / len(offsets):+.1f} ms, "
+              f"min {min(offsets):+.1f} ms, max {max(offsets):+.1f} ms")
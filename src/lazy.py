@@ -0,0 +1,54 @@
+import sys  # loaded modules
+import importlib  # thread safe imports
+import threading  # background warm-up
+
+
+class LazyModule:
+    """
+        Stand-in for a module that is only imported on its first attribute access.
+
+        Entry points hold their heavy dependencies (requests and dateparser through
+        python-binance, websockets, numpy) this way, so `-h` and argument errors return
+        before any of them is loaded, and what is only needed after the coin input can
+        be imported by `warm` while it is typed.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = sys.modules.get(name)
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)  # waits for a warm-up importing it
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'{' (loaded)' if self._module is not None else ''}>"
+
+
+def module(name):
+    """ Module `name`, imported on first use. """
+
+    return LazyModule(name)
+
+
+def warm(*names):
+    """
+        Import modules on a background thread, e.g. while waiting for user input. A first
+        use from another thread meanwhile waits for that module to finish loading.
+
+        :return: the warm-up thread
+    """
+    def run():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass  # raised again at the first use
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,409 @@
+import math  # math utils funcs
+import time  # Timing
+import json  # raw frames
+import random  # price walk and latency jitter
+import asyncio  # ticker stream
+import threading  # balance lock
+
+import latency
+
+# Fill behaviours
+FILL_FULL = "full"  # every order fills completely
+FILL_PARTIAL = "partial"  # market orders only fill half, then expire
+FILL_REJECT = "reject"  # every order is rejected by the "matching engine"
+FILL_MODES = (FILL_FULL, FILL_PARTIAL, FILL_REJECT)
+
+QUOTE_ASSET = "BTC"
+
+
+class MockResponse:
+    """ Minimal stand-in for a requests response, enough to build a BinanceAPIException. """
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+
+class MockExchange:
+    """
+        In-process stand-in for the parts of Binance the bots talk to.
+
+        Holds symbols, balances and prices, fills market orders according to
+        `fill_mode` and injects `latency_ms` (+ up to `jitter_ms`) of delay into
+        every REST call to model the network round trip.
+    """
+
+    def __init__(self, latency_ms=0., jitter_ms=0., fill_mode=FILL_FULL, fills=3, slippage=0.001,
+                 tps=5, volatility=0.002, drift=0., seed=None):
+        assert fill_mode in FILL_MODES, f"ERROR: unknown fill mode '{fill_mode}'"
+
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fill_mode = fill_mode
+        self.fills = max(1, int(fills))  # number of fills an order is split into
+        self.slippage = slippage  # price impact between first and last fill, as a ratio
+        self.tps = tps  # ticker messages per second
+        self.volatility = volatility  # std dev of per-tick price change, as a ratio
+        self.drift = drift  # mean per-tick price change, as a ratio
+        self.rng = random.Random(seed)
+
+        self.symbols = {}  # symbol -> symbol info
+        self.prices = {}  # symbol -> last traded price
+        self.balances = {QUOTE_ASSET: 1.}  # asset -> free balance
+        self.orders = []  # sent/received/responded perf_counter_ns stamps and response of every order
+        self.ticks = {}  # symbol -> perf_counter_ns of the last ticker message sent
+        self.update_id = 1  # depth update id, shared by every symbol
+        self.order_id = 0
+        self.lock = threading.Lock()
+        self.listeners = []  # (loop, queue) of every connected user data stream
+
+    def add_symbol(self, base_asset, quote_asset=QUOTE_ASSET, price=0.0001,
+                   tick_size="0.00000001", step_size="1.00000000"):
+        """ Register a tradable symbol with the same filter layout Binance returns. """
+
+        symbol = f"{base_asset}{quote_asset}"
+        self.symbols[symbol] = {
+            "symbol": symbol,
+            "status": "TRADING",
+            "baseAsset": base_asset,
+            "baseAssetPrecision": 8,
+            "quoteAsset": quote_asset,
+            "quotePrecision": 8,
+            "orderTypes": ["LIMIT", "MARKET"],
+            "icebergAllowed": True,
+            "filters": [
+                {"filterType": "PRICE_FILTER", "minPrice": tick_size,
+                 "maxPrice": "1000.00000000", "tickSize": tick_size},
+                {"filterType": "PERCENT_PRICE", "multiplierUp": "5", "multiplierDown": "0.2", "avgPriceMins": 5},
+                {"filterType": "LOT_SIZE", "minQty": step_size, "maxQty": "90000000.00000000", "stepSize": step_size},
+                {"filterType": "MIN_NOTIONAL", "minNotional": "0.00010000",
+                 "applyToMarket": True, "avgPriceMins": 5},
+            ],
+        }
+        self.prices[symbol] = float(price)
+        self.balances.setdefault(base_asset, 0.)
+        self.balances.setdefault(quote_asset, 0.)
+        return symbol
+
+    def delay(self):
+        """ Block for the configured network latency. """
+
+        delay_ms = self.latency_ms + self.rng.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def step(self, symbol):
+        """ Advance the random price walk of a symbol by one tick and return the new price. """
+
+        with self.lock:
+            price = self.prices[symbol] * (1 + self.rng.gauss(self.drift, self.volatility))
+            self.prices[symbol] = price
+        return price
+
+    def ticker(self, symbol):
+        """ Build a 24hr ticker message in the format of the Binance ticker stream. """
+
+        price = self.step(symbol)
+        spread = price * 0.0005
+        self.ticks[symbol] = time.perf_counter_ns()
+        return {
+            "e": "24hrTicker",
+            "E": int(time.time() * 1000),
+            "s": symbol,
+            "c": f"{price:.8f}",
+            "b": f"{price - spread:.8f}",
+            "a": f"{price + spread:.8f}",
+            "v": f"{self.rng.uniform(1e5, 1e6):.8f}",
+            "Q": f"{self.rng.uniform(1, 1e3):.8f}",
+        }
+
+    def ticker_frame(self, symbol):
+        """ Raw text of a ticker frame, with every field of the Binance ticker stream in its order. """
+
+        msg = self.ticker(symbol)
+        price = float(msg["c"])
+        return json.dumps({
+            "e": msg["e"], "E": msg["E"], "s": symbol, "p": f"{price * 0.1:.8f}", "P": "10.000",
+            "w": f"{price * 0.95:.8f}", "x": f"{price * 0.9:.8f}", "c": msg["c"], "Q": msg["Q"],
+            "b": msg["b"], "B": f"{self.rng.uniform(1, 1e4):.8f}", "a": msg["a"], "A": f"{self.rng.uniform(1, 1e4):.8f}",
+            "o": f"{price * 0.9:.8f}", "h": f"{price * 1.1:.8f}", "l": f"{price * 0.8:.8f}", "v": msg["v"],
+            "q": f"{float(msg['v']) * price:.8f}", "O": msg["E"] - 86400000, "C": msg["E"],
+            "F": 1000, "L": 1000 + self.update_id, "n": 1 + self.update_id,
+        }, separators=(',', ':'))
+
+    async def ticker_stream(self, symbol, decode=None):
+        """
+            Stand-in for `engine.ticker_stream`: a ticker message of `symbol` every 1/tps seconds.
+            With `decode`, raw frames go through it like on the real stream.
+        """
+        while True:
+            if decode is None:
+                yield self.ticker(symbol.upper())
+            else:
+                msg = decode(self.ticker_frame(symbol.upper()))
+                if msg is not None:
+                    yield msg
+            await asyncio.sleep(1 / self.tps)
+
+    def depth(self, symbol, limit=100):
+        """ Depth snapshot of `limit` levels per side around the current price, 0.1% apart. """
+
+        price = self.prices[symbol]
+        return {
+            "lastUpdateId": self.update_id,
+            "bids": [[f"{price * (1 - 0.001 * i):.8f}", f"{self.rng.uniform(1, 1000):.8f}"] for i in range(1, limit + 1)],
+            "asks": [[f"{price * (1 + 0.001 * i):.8f}", f"{self.rng.uniform(1, 1000):.8f}"] for i in range(1, limit + 1)],
+        }
+
+    def depth_update(self, symbol, changes=5):
+        """ Diff depth event changing (or, with a quantity of 0, removing) a few random levels near the price. """
+
+        price = self.prices[symbol]
+        first = self.update_id + 1
+        self.update_id += changes
+
+        def levels(sign):
+            return [[f"{price * (1 + sign * 0.001 * self.rng.randint(1, 20)):.8f}",
+                     f"{self.rng.choice([0, self.rng.uniform(1, 1000)]):.8f}"] for _ in range(changes)]
+
+        return {"e": "depthUpdate", "E": int(time.time() * 1000), "s": symbol,
+                "U": first, "u": self.update_id, "b": levels(-1), "a": levels(1)}
+
+    async def depth_stream(self, symbol):
+        """ Stand-in for `engine.depth_stream`: a diff depth event of `symbol` every 100 ms. """
+
+        while True:
+            yield self.depth_update(symbol.upper())
+            await asyncio.sleep(0.1)
+
+    async def user_stream(self, listen_key, on_connect=None):
+        """ Stand-in for `engine.user_stream`: execution reports and account updates of the orders placed. """
+
+        queue = asyncio.Queue()
+        listener = (asyncio.get_running_loop(), queue)
+        self.listeners.append(listener)
+        if on_connect is not None:
+            on_connect()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.listeners.remove(listener)
+
+    def push(self, event):
+        """ Send a user data event to every connected user data stream, from any thread. """
+
+        for loop, queue in list(self.listeners):
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def error(self, code, msg, status_code=400):
+        """ Raise the exception python-binance would raise for an API error. """
+
+        from binance.exceptions import BinanceAPIException
+        raise BinanceAPIException(MockResponse(status_code, f'{{"code": {code}, "msg": "{msg}"}}'))
+
+    def place_market_order(self, symbol, side, quantity=None, quote_qty=None):
+        """ Match a market order against the current price, splitting it into `fills` fills. """
+
+        if symbol not in self.symbols:
+            self.error(-1121, "Invalid symbol.")
+        if self.fill_mode == FILL_REJECT:
+            self.error(-2010, "Account has insufficient balance for requested action.")
+
+        info = self.symbols[symbol]
+        lot_size = next(f for f in info["filters"] if f["filterType"] == "LOT_SIZE")
+        step_size = float(lot_size["stepSize"])
+        price = self.prices[symbol]
+        sign = 1 if side == "BUY" else -1
+
+        # fill ratio of the requested amount
+        ratio = 0.5 if self.fill_mode == FILL_PARTIAL else 1.
+
+        fills = []
+        executed_qty = 0.
+        quote_total = 0.
+        for i in range(self.fills):
+            fill_price = price * (1 + sign * self.slippage * i / self.fills)
+            if quote_qty is not None:
+                fill_qty = ratio * float(quote_qty) / self.fills / fill_price
+            else:
+                fill_qty = ratio * float(quantity) / self.fills
+            fill_qty = math.floor(fill_qty / step_size) * step_size
+            if fill_qty <= 0:
+                continue
+            executed_qty += fill_qty
+            quote_total += fill_qty * fill_price
+            fills.append({"price": f"{fill_price:.8f}", "qty": f"{fill_qty:.8f}",
+                          "commission": "0.00000000", "commissionAsset": "BNB"})
+
+        # settle balances
+        with self.lock:
+            base, quote = info["baseAsset"], info["quoteAsset"]
+            self.balances[base] = self.balances.get(base, 0.) + sign * executed_qty
+            self.balances[quote] = self.balances.get(quote, 0.) - sign * quote_total
+            self.order_id += 1
+            order_id = self.order_id
+
+        order = {
+            "symbol": symbol,
+            "orderId": order_id,
+            "orderListId": -1,
+            "clientOrderId": f"mock{order_id}",
+            "transactTime": int(time.time() * 1000),
+            "price": "0.00000000",
+            "origQty": f"{executed_qty / ratio:.8f}",
+            "executedQty": f"{executed_qty:.8f}",
+            "cummulativeQuoteQty": f"{quote_total:.8f}",
+            "status": "FILLED" if self.fill_mode == FILL_FULL else "EXPIRED",
+            "timeInForce": "GTC",
+            "type": "MARKET",
+            "side": side,
+            "fills": fills,
+        }
+
+        # user data events are pushed before the response goes out, like they usually arrive first
+        executed, cumulative = 0., 0.
+        for i, fill in enumerate(fills):
+            executed += float(fill["qty"])
+            cumulative += float(fill["qty"]) * float(fill["price"])
+            last = i == len(fills) - 1
+            self.push({"e": "executionReport", "E": order["transactTime"], "s": symbol, "c": order["clientOrderId"],
+                       "S": side, "o": "MARKET", "x": "TRADE", "X": order["status"] if last else "PARTIALLY_FILLED",
+                       "i": order_id, "l": fill["qty"], "z": f"{executed:.8f}", "L": fill["price"],
+                       "Z": f"{cumulative:.8f}", "n": fill["commission"], "N": fill["commissionAsset"],
+                       "T": order["transactTime"]})
+        with self.lock:
+            balances = [{"a": asset, "f": f"{self.balances[asset]:.8f}", "l": "0.00000000"} for asset in (base, quote)]
+        self.push({"e": "outboundAccountPosition", "E": order["transactTime"], "u": order["transactTime"], "B": balances})
+        return order
+
+
+class MockCombinedStream:
+    """ Stand-in for `engine.CombinedStream`: a ticker message of every subscribed symbol every 1/tps seconds. """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.names = set()
+
+    async def subscribe(self, *names):
+        self.names.update(names)
+
+    async def unsubscribe(self, *names):
+        self.names.difference_update(names)
+
+    async def __aiter__(self):
+        while True:
+            for name in sorted(self.names):
+                yield self.exchange.ticker(name.split("@")[0].upper())
+            await asyncio.sleep(1 / self.exchange.tps)
+
+
+class MockOrderTemplate:
+    """ Stand-in for `ordertemplate.OrderTemplate` placing its order through a `MockClient`. """
+
+    def __init__(self, client, clock=None, **params):
+        self.client = client
+        self.params = params
+
+    def bind(self, **values):
+        return MockOrderTemplate(self.client, **dict(self.params, **values))
+
+    def fire(self, **values):
+        return self.client.create_order(**dict(self.params, **values))
+
+
+class MockClient:
+    """
+        Drop-in replacement for `binance.client.Client` covering the calls the bots make.
+
+        Informational calls pay the full exchange latency. Orders pay half of it on
+        the way in and half on the way out, so the receive timestamp recorded by the
+        exchange sits halfway through the round trip.
+    """
+
+    def __init__(self, exchange, api_key=None, api_secret=None):
+        self.exchange = exchange
+        self.API_KEY = api_key
+        self.API_SECRET = api_secret
+
+    def ping(self):
+        self.exchange.delay()
+        return {}
+
+    def get_server_time(self):
+        self.exchange.delay()
+        return {"serverTime": int(time.time() * 1000)}
+
+    def get_asset_balance(self, asset, **params):
+        self.exchange.delay()
+        free = self.exchange.balances.get(asset)
+        if free is None:
+            return None
+        return {"asset": asset, "free": f"{free:.8f}", "locked": "0.00000000"}
+
+    def get_account(self, **params):
+        self.exchange.delay()
+        return {"balances": [{"asset": asset, "free": f"{free:.8f}", "locked": "0.00000000"}
+                             for asset, free in self.exchange.balances.items()]}
+
+    def stream_get_listen_key(self):
+        self.exchange.delay()
+        return "mock-listen-key"
+
+    def stream_keepalive(self, listenKey):
+        self.exchange.delay()
+        return {}
+
+    def stream_close(self, listenKey):
+        self.exchange.delay()
+        return {}
+
+    def get_exchange_info(self):
+        self.exchange.delay()
+        return {
+            "timezone": "UTC",
+            "serverTime": int(time.time() * 1000),
+            "rateLimits": [],
+            "exchangeFilters": [],
+            "symbols": list(self.exchange.symbols.values()),
+        }
+
+    def get_symbol_info(self, symbol):
+        self.exchange.delay()
+        return self.exchange.symbols.get(symbol.upper())
+
+    def get_order_book(self, **params):
+        self.exchange.delay()
+        return self.exchange.depth(params["symbol"], params.get("limit", 100))
+
+    def create_order(self, **params):
+        record = {"sent": time.perf_counter_ns()}
+        self.exchange.orders.append(record)
+        latency.stamp(latency.SENT)  # like the transport hook of `latency.instrument`
+
+        half = (self.exchange.latency_ms + self.exchange.rng.uniform(0, self.exchange.jitter_ms)) / 2000
+        time.sleep(half)  # request leg
+        record["received"] = time.perf_counter_ns()
+        if params.get("type", "MARKET") != "MARKET":
+            self.exchange.error(-1013, "Only MARKET orders are supported by the mock exchange.")
+        order = self.exchange.place_market_order(params["symbol"], params["side"],
+                                                 quantity=params.get("quantity"),
+                                                 quote_qty=params.get("quoteOrderQty"))
+        time.sleep(half)  # response leg
+        record["responded"] = time.perf_counter_ns()
+        latency.stamp(latency.RECEIVED)
+        record["order"] = order
+        return order
+
+    def order_market(self, **params):
+        params.update({"type": "MARKET"})
+        return self.create_order(**params)
+
+    def order_market_buy(self, **params):
+        params.update({"side": "BUY"})
+        return self.order_market(**params)
+
+    def order_market_sell(self, **params):
+        params.update({"side": "SELL"})
+        return self.order_market(**params)
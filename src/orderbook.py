@@ -0,0 +1,202 @@
+import asyncio  # event loop
+from array import array  # compact price level storage
+from bisect import bisect_left  # sorted insert
+from collections import namedtuple
+
+from engine import call
+
+DEPTH_LIMIT = 1000  # levels per side in the snapshot
+
+# Expected outcome of a market order walking the book
+Fill = namedtuple("Fill", ["price", "levels", "slippage", "complete"])
+
+
+class BookSide:
+    """
+        Price levels of one side of the book, best first.
+
+        Prices and quantities live in two parallel sorted arrays. Bids are stored as
+        negated prices, so both sides sort ascending with the best level at index 0
+        and a diff update is one bisect plus an in-place insert, overwrite or delete.
+    """
+
+    def __init__(self, descending):
+        self.sign = -1. if descending else 1.
+        self.keys = array('d')  # sign * price, ascending
+        self.qtys = array('d')
+
+    def clear(self):
+        del self.keys[:]
+        del self.qtys[:]
+
+    def set(self, price, qty):
+        """ Set the quantity at `price`, a quantity of 0 removes the level. """
+
+        key = self.sign * price
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            if qty == 0:
+                del self.keys[i]
+                del self.qtys[i]
+            else:
+                self.qtys[i] = qty
+        elif qty != 0:
+            self.keys.insert(i, key)
+            self.qtys.insert(i, qty)
+
+    def best(self):
+        return self.sign * self.keys[0] if self.keys else None
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class OrderBook:
+    """
+        Local L2 mirror of a symbol, built from a depth snapshot plus the diff stream.
+
+        Follows the Binance procedure: diff events up to the snapshot's lastUpdateId
+        are dropped, the first applied event must bridge it, and every later event
+        must start right after the previous one. Anything else is a gap, after which
+        `apply` returns False and the book has to be reloaded from a new snapshot.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol.upper()
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = None  # None until a snapshot is loaded
+        self.bridged = False  # whether a diff event has been applied on top of the snapshot
+
+    @property
+    def ready(self):
+        return self.last_update_id is not None and len(self.asks) > 0 and len(self.bids) > 0
+
+    def reset(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+        self.bridged = False
+
+    def load(self, snapshot):
+        """ Replace the book with a `Client.get_order_book` snapshot. """
+
+        self.reset()
+        for price, qty in snapshot["bids"]:
+            self.bids.set(float(price), float(qty))
+        for price, qty in snapshot["asks"]:
+            self.asks.set(float(price), float(qty))
+        self.last_update_id = snapshot["lastUpdateId"]
+
+    def apply(self, event):
+        """
+            Apply a diff depth event.
+
+            :return: False on a sequence gap (the book must be reloaded), True otherwise
+        """
+        if self.last_update_id is None:
+            return False
+        if event["u"] <= self.last_update_id:
+            return True  # already part of the snapshot
+
+        expected = self.last_update_id + 1
+        if (event["U"] > expected) or (self.bridged and event["U"] != expected):
+            return False
+
+        for price, qty in event["b"]:
+            self.bids.set(float(price), float(qty))
+        for price, qty in event["a"]:
+            self.asks.set(float(price), float(qty))
+        self.last_update_id = event["u"]
+        self.bridged = True
+        return True
+
+    def estimate_buy(self, quote_qty):
+        """ Expected fill of a market buy spending `quote_qty` of the quote asset (quoteOrderQty). """
+
+        remaining = quote_qty
+        bought = 0.
+        levels = 0
+        for key, qty in zip(self.asks.keys, self.asks.qtys):
+            levels += 1
+            cost = key * qty
+            if cost >= remaining:
+                bought += remaining / key
+                remaining = 0.
+                break
+            bought += qty
+            remaining -= cost
+
+        if not bought:
+            return Fill(None, 0, None, False)
+        price = (quote_qty - remaining) / bought
+        return Fill(price, levels, price / self.asks.best() - 1, remaining == 0)
+
+    def estimate_sell(self, qty):
+        """ Expected fill of a market sell of `qty` of the base asset. """
+
+        remaining = qty
+        proceeds = 0.
+        levels = 0
+        for key, level_qty in zip(self.bids.keys, self.bids.qtys):
+            levels += 1
+            filled = min(remaining, level_qty)
+            proceeds += -key * filled  # bid keys are negated prices
+            remaining -= filled
+            if remaining <= 0:
+                break
+
+        if not proceeds:
+            return Fill(None, 0, None, False)
+        price = proceeds / (qty - remaining)
+        return Fill(price, levels, 1 - price / self.bids.best(), remaining <= 0)
+
+    def max_buy_quote(self, max_slippage):
+        """ Largest quoteOrderQty whose every fill is at most `max_slippage` (ratio) above the best ask. """
+
+        if not self.ready:
+            return 0.
+        limit = self.asks.best() * (1 + max_slippage)
+        quote = 0.
+        for key, qty in zip(self.asks.keys, self.asks.qtys):
+            if key > limit:
+                break
+            quote += key * qty
+        return quote
+
+
+def describe(fill, base_asset, quote_asset):
+    """ One line summary of an expected fill for the logs. """
+
+    if fill.price is None:
+        return "Expected fill: book is empty"
+    return "Expected fill: {price:.8f} {quote}/{base} over {levels} levels, slippage {slippage:.3f}%{depth}".format(
+        price=fill.price, quote=quote_asset, base=base_asset, levels=fill.levels,
+        slippage=100 * fill.slippage, depth="" if fill.complete else " (book too shallow)")
+
+
+async def maintain(book, client, stream, limit=DEPTH_LIMIT, after=None):
+    """
+        Keep `book` in sync with the diff depth `stream` until cancelled. Events are
+        queued while a snapshot is in flight, and a new snapshot is loaded on every gap.
+
+        The first snapshot waits for the `after` event, if any, e.g. for the buy to be
+        sent, so the heavy request does not compete with it; events are queued meanwhile.
+    """
+    queue = asyncio.Queue()
+
+    async def read():
+        async for event in stream:
+            queue.put_nowait(event)
+
+    reader = asyncio.create_task(read())
+    try:
+        if after is not None:
+            await after.wait()
+        while True:
+            book.load(await call(client.get_order_book, symbol=book.symbol, limit=limit))
+            while book.apply(await queue.get()):
+                pass
+            book.reset()  # sequence gap, resync
+    finally:
+        reader.cancel()
@@ -0,0 +1,110 @@
+import hmac  # request signing
+import time  # Timing
+import hashlib  # request signing
+
+import requests
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+import latency
+
+TIMEOUT = 10  # seconds, same as python-binance
+
+
+def encode(value):
+    """ Query string form of a param value. Floats are written out in full instead of e.g. '1e-05'. """
+
+    if isinstance(value, float):
+        return f"{value:.8f}"
+    return str(value)
+
+
+class OrderTemplate:
+    """
+        POST /v3/order request whose static parts are built once, ahead of the trigger.
+
+        The params are sorted like python-binance sorts them, so the query string is a
+        list of fixed text pieces around the variable params (None values) and the
+        timestamp. The HMAC key schedule and the text before the first variable are
+        absorbed into a hash state up front, and the request is prepared once with the
+        session's headers and environment settings. Firing fills in the variables,
+        copies the hash state to sign the rest, and sends a copy of the prepared request.
+    """
+
+    def __init__(self, client, clock=None, **params):
+        self.client = client
+        self.clock = clock
+        self.limiter = getattr(client, "rate_limiter", None)  # set by `RateLimiter.attach`
+        self.params = params  # None marks a variable param
+        params = dict(params, timestamp=None)
+
+        # fixed text pieces and the names of the variables between them
+        self.pieces, self.variables = [], []
+        text = ""
+        for key in sorted(params):
+            text += f"{'&' if text or self.pieces else ''}{key}="
+            if params[key] is None:
+                self.pieces.append(text)
+                self.variables.append(key)
+                text = ""
+            else:
+                text += encode(params[key])
+        self.pieces.append(text)
+
+        self.hmac = hmac.new(client.API_SECRET.encode('utf-8'), self.pieces[0].encode('utf-8'), hashlib.sha256)
+        self.request = client.session.prepare_request(requests.Request(
+            'POST', f"{client.API_URL}/v3/order",
+            headers={"Content-Type": "application/x-www-form-urlencoded"}, data=self.pieces[0]))
+        # proxies, CA bundle, ... from the environment, which requests would otherwise scan on every send
+        self.settings = client.session.merge_environment_settings(self.request.url, {}, None, None, None)
+
+    def bind(self, **values):
+        """ Template with some of the variable params fixed, e.g. the quantity of a sell once the buy is filled. """
+
+        params = dict(self.params)
+        params.update(values)
+        return OrderTemplate(self.client, self.clock, **params)
+
+    def body(self, values):
+        """ Signed query string for `values` of the variable params. """
+
+        values["timestamp"] = int(self.clock.now() if self.clock else time.time() * 1000)
+        rest = "".join(encode(values[key]) + piece for key, piece in zip(self.variables, self.pieces[1:]))
+        signature = self.hmac.copy()
+        signature.update(rest.encode('utf-8'))
+        return f"{self.pieces[0]}{rest}&signature={signature.hexdigest()}"
+
+    def fire(self, **values):
+        """ Send the order with `values` of the variable params, returns the decoded response like `Client.create_order`. """
+
+        if self.limiter is not None:
+            self.limiter.acquire(order=True)  # before signing, so the timestamp is taken after any wait
+        body = self.body(values).encode('utf-8')
+        latency.stamp(latency.SIGNED)
+
+        request = self.request.copy()
+        request.body = body
+        request.headers["Content-Length"] = str(len(body))
+        response = self.client.session.send(request, timeout=TIMEOUT, **self.settings)
+
+        if not str(response.status_code).startswith('2'):
+            raise BinanceAPIException(response)
+        try:
+            order = response.json()
+        except ValueError:
+            raise BinanceRequestException('Invalid Response: %s' % response.text)
+        latency.stamp(latency.PARSED)
+        return order
+
+
+def market_buy(client, quote_qty, clock=None, template=OrderTemplate):
+    """ Template of a market buy spending `quote_qty` of the quote asset, fired with the symbol. """
+
+    return template(client, clock, symbol=None, side="BUY", type="MARKET",
+                    quoteOrderQty=quote_qty, newOrderRespType="FULL")
+
+
+def market_sell(client, clock=None, template=OrderTemplate):
+    """ Template of a market sell, fired (or bound) with the symbol and quantity. """
+
+    return template(client, clock, symbol=None, side="SELL", type="MARKET",
+                    quantity=None, newOrderRespType="FULL")
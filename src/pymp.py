@@ -1,30 +1,54 @@
-import math
 import os # Util
 import argparse # Command parser
 import time # Timing
 import json # JSON
-import csv # For price history analysis
-import threading  # multithreading
+import asyncio # Event loop
 
 # python-binance lib
-from binance.enums import *
-from binance.client import Client
-from twisted.internet import reactor
-from binance.websockets import BinanceSocketManager
 from binance.exceptions import BinanceAPIException, BinanceOrderException
 
+import lazy
+import exitrules
+import tickrec
+import orderbook
+import latency
+import fixedpoint
+from ingest import TickerFilter
+from engine import Engine, call, ticker_stream, depth_stream, user_stream
+from symbolcache import SymbolCache
+from symbolindex import SymbolIndex
+from ratelimit import RateLimiter
+
+# Heavy modules load on first use, so -h and argument errors return at once
+binance_client = lazy.module("binance.client") # requests and dateparser
+connpool = lazy.module("connpool")
+clocksync = lazy.module("clocksync")
+userdata = lazy.module("userdata")
+ordertemplate = lazy.module("ordertemplate")
+tickstore = lazy.module("tickstore") # numpy
+WARM = ("tickstore",) # only needed once the coin is known, imported while it is typed
+
 # Constants
 DEV_KEY_FILE = "dev-key.json" # dev key file
 DEV_KEY_API = "api-key" # api-key identifier
 DEV_KEY_SECRET = "secret-key" # secret-key identifier
 QUOTE_ASSET = "BTC"
-TPS = 5 # ticks per second post-buy -> may also query binance at this rate
+
+quote_asset = QUOTE_ASSET # asset the coin is bought with
 
 # Realtime async price update
-sync_lock = threading.Lock() # used for accessing sync price
+clock = None # exchange clock tracker, the local clock is used until it is set
 order_last_price = None # last fetched order asset price
-price_history = {} # used for tracking price for post analysis
+recorder = None # tick recorder used for post analysis
+ticks = None # rolling price statistics, allocated at the entry
 order_buy_price = None # order price at buy time
+order_buy = None # total quote asset spent at buy time
+order_buy_time = None # exchange time of the buy fill, ms
+ledger = None # balances and fills pushed by the user data stream
+buy_template = None # buy request built ahead of the coin input
+sell_template = None # sell request built ahead of the quantity
+buy_trace = latency.Trace("buy") # hot path stage timings of the buy
+sell_trace = latency.Trace("sell") # hot path stage timings of the sell
 
 def prompt_key_file():
     """ Prompt to configure before usage, then quit 5s later. """
@@ -34,22 +58,157 @@ def prompt_key_file():
     exit()
 
 def fetch_price(ping):
-    """ Callback for updating last known quote asset price via web socket. """
+    """ Tick handler: update the last known price, return a reason to sell once an exit rule triggers. """
 
-    if ping["e"] != "error":
-        with sync_lock:
-            global order_last_price
-            order_last_price = float(ping["c"]) # update most recent known price
-            price_history[now()] = order_last_price # append to history for analysis
+    global order_last_price
+    price = float(ping["c"])
+    recorder.write(ping["E"], price, float(ping["b"]), float(ping["a"]), float(ping["v"])) # record for analysis, at the event time
+    ticks.append(ping["E"] / 1000, price, float(ping["Q"])) # at the event time, with the last trade quantity
+    if price == order_last_price:
+        return None # the exit rules already saw this price, the deadline is a timer
+    order_last_price = price # update most recent known price
+    return rules.update(price, now() / 1000)
 
 def now():
-    return int(round(time.time() * 1000)) # ms
+    return int(round(clock.now() if clock else time.time() * 1000)) # ms, on the exchange clock once synced
+
+async def buy():
+    """ Place order at market value using a balance quote. Returns whether it was filled. """
+
+    global order_buy, order_buy_price, order_buy_time
+
+    try:
+        order = await call(latency.traced(buy_trace, buy_template.fire), symbol=symbol)
+        if order["status"] == "FILLED":
+            fills = fixedpoint.Fills(order)
+            fills_num = fills.count
+
+            executedQty = fills.executed
+            order_buy = fills.total
+            order_buy_price = fills.price
+            buy_trace.stamp(latency.FILLED)
+            buy_trace.server_time(order["transactTime"])
+
+            pump_buy_t1 = order_buy_time = order["transactTime"]
+            pump_buy_ms = pump_buy_t1 - pump_buy_t0 # Time taken to buy in ms
+            
+            s, ms = divmod(pump_buy_t1, 1000)
+
+            print("Bought {qty} {base} for {price} {asset} in {time} ms ({fills} fills @ {timestamp}.{ms:03d})".format(
+                qty=executedQty, base=base_asset, price=order_buy,
+                asset=quote_asset, time=pump_buy_ms, fills=fills_num,
+                timestamp=time.strftime('%H:%M:%S', time.gmtime(s)), ms=ms))
+
+            return True
+        else:
+            print(f"Order has not been filled. Response:")
+            print(order)
+    except BinanceAPIException as e:
+        # error handling goes here
+        print(e)
+    except BinanceOrderException as e:
+        # error handling goes here
+        print(e)
+
+    return False
+
+async def size_sell(wait=True):
+    """ (sell order bound to the base asset balance after the buy, its quantity), queried at once if not `wait`. """
+
+    # ensure LOT_SIZE constraint passes, rounded exactly in fixed point
+    precision = fixedpoint.Precision.of(symbols, symbol)
+    base_units = await userdata.balance(ledger, base_asset, order_buy_time, userdata.FILL_TIMEOUT if wait else 0) # pushed by the user data stream
+    if base_units is None:
+        print("No account update for the buy yet, querying the balance")
+        base_units = fixedpoint.units((await call(client.get_asset_balance, asset=base_asset))['free'])
+    sell_qty = precision.quantity(base_units)
+    return sell_template.bind(symbol=symbol, quantity=sell_qty), sell_qty # only the timestamp is left to sign
+
+async def sell(sell_order, sell_qty, reason, book):
+    """ Sell `sell_qty` of the base asset at market value, with `sell_order` bound to that quantity. """
+
+    pump_sell_t0 = now() # ms
+    expected = book.estimate_sell(float(sell_qty)) if book.ready else None # expected fill from the local book
+
+    try:
+        order = await call(latency.traced(sell_trace, sell_order.fire))
+        if order["status"] == "FILLED":
+            fills = fixedpoint.Fills(order)
+            fills_num = fills.count
+
+            executedQty = fills.executed
+            sell = fills.total
+            sell_price = fills.price
+            sell_trace.stamp(latency.FILLED)
+            sell_trace.server_time(order["transactTime"])
+
+            pump_sell_t1 = order["transactTime"]
+            pump_sell_ms = pump_sell_t1 - pump_sell_t0 # Time taken to sell in ms
+            
+            s, ms = divmod(pump_sell_t1, 1000)
+
+            print("Sold {qty} {base} for {price} {asset} in {time} ms ({fills} fills @ {timestamp}.{ms:03d}) due to {reason}".format(
+                qty=executedQty, base=base_asset, price=sell,
+                asset=quote_asset, time=pump_sell_ms, fills=fills_num,
+                timestamp=time.strftime('%H:%M:%S', time.gmtime(s)), ms=ms, reason=reason))
+            
+            if expected:
+                print(orderbook.describe(expected, base_asset, quote_asset) + ", actual {:.8f}".format(sell_price))
+            print("Profit: {:.4f}%".format(100 * (sell - order_buy) / order_buy))
+        else:
+            print(f"Order has not been filled. Response:")
+            print(order)
+    except BinanceAPIException as e:
+        # error handling goes here
+        print(e)
+    except BinanceOrderException as e:
+        # error handling goes here
+        print(e)
+
+async def pump():
+    """ Buy, watch the price until an exit rule triggers, then sell. """
+
+    global ticks
+
+    # Subscribe to the ticker while the buy order is in flight
+    # Cut only the fields fetch_price reads out of the frames, every tick is kept for the recording
+    engine = Engine(ticker_stream(symbol, decode=TickerFilter(("E", "c", "b", "a", "v", "Q"))), clock).start()
+
+    # Mirror the order book to estimate the fill of the sell
+    book = orderbook.OrderBook(symbol)
+    bought = asyncio.Event()  # the snapshot waits for the buy
+    book_task = asyncio.create_task(orderbook.maintain(book, client, depth_stream(symbol), after=bought))
+
+    sizing = None
+    try:
+        if not await buy():
+            return
+        bought.set()
+
+        # Sell as soon as any exit rule triggers, the sell is sized meanwhile
+        rules.start(order_buy_price, pump_buy_t0 / 1000)
+        ticks = tickstore.TickBuffer() # fresh at the entry, allocated off the buy path
+        sizing = asyncio.create_task(size_sell())
+        reason = await engine.watch(fetch_price, rules.deadline, since=order_buy_time) # ticks from the fill on
+        sell_trace.stamp(latency.DECISION)
+        sell_order, sell_qty = sizing.result() if sizing.done() else await size_sell(wait=False) # the sell never waits for a lagging user data stream
+        await sell(sell_order, sell_qty, reason, book)
+        print(f"Price at the decision: {ticks.describe()}")
+    finally:
+        # stop websockets
+        if sizing is not None:
+            sizing.cancel()
+        book_task.cancel()
+        await engine.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Pump n dump automated bot')
-    parser.add_argument("--quote", type=str, default=None, required=True, help=f"amount of {QUOTE_ASSET} to use to purchase coin")
+    parser.add_argument("--quote", type=str, default=None, required=True, help="amount of the quote asset to use to purchase coin")
+    parser.add_argument("--quote_asset", type=str, default=QUOTE_ASSET, required=False, help=f"Quote asset to purchase coin with, e.g. BTC, ETH or USDT (default {QUOTE_ASSET})")
     parser.add_argument("--wait", type=int, default=0, required=True, help="Time to wait between buy and sell, in seconds")
     parser.add_argument("--sf", type=float, default=1., required=False, help="Sell factor: sf = sell price/buy price. Between 1.1 and 20")
+    parser.add_argument("--exit", type=str, default=None, required=False, help=exitrules.HELP)
+    parser.add_argument("--csv", action="store_true", help="Also export the price history to CSV after the run")
     args = parser.parse_args()
 
     # Handle API key load
@@ -81,6 +240,7 @@ if __name__ == "__main__":
 
     assert args.wait != 0, "ERROR: Must specify a non zero value for --wait, use 'python pymp.py -h' for help"
     quote = float(args.quote)
+    quote_asset = args.quote_asset.upper()
 
     # Constrain sell factor within bounds if it's being used
     sf_crit = float(args.sf)
@@ -91,159 +251,91 @@ if __name__ == "__main__":
         sf_crit = min(float(sf_crit), 20)
         print(f"Using a sell factor of {sf_crit}")
 
+    # Sell after --wait, at the sell factor, or at whichever extra exit rule triggers first
+    rules = exitrules.parse(args.exit).add(exitrules.Deadline(args.wait))
+    if sf_crit != 0:
+        rules.add(exitrules.TakeProfit(sf_crit))
+    print(f"Exit rules: {rules}")
+
     # Create new client obj
     try:
 
-        client = Client(public_key, private_key)
+        client = binance_client.Client(public_key, private_key)
     except Exception as e:
         print(e)
         exit()
     print("Session initiated with Binance API")
+
+    # Keep the connections to the API open while waiting for the pump, so the buy skips the handshake
+    connections = connpool.ConnectionManager(client).start()
+    print(connections.report())
+
+    # Track the exchange clock, so orders are signed with its time and deadlines and timings are measured on it
+    clock = clocksync.ClockSync(client).start()
+    clock.attach(client)
+    print(clock.report())
+
+    # Track the request weight and order count limits, orders get the budget first
+    limiter = RateLimiter()
+    limiter.attach(client)
+
+    # Time every stage the orders go through
+    latency.instrument(client)
+
+    # Build the orders up front, so the trigger only fills in the symbol (or quantity) and signs
+    buy_template = ordertemplate.market_buy(client, quote, clock)
+    sell_template = ordertemplate.market_sell(client, clock)
+
+    # Follow balances and fills through the user data stream, so the sell is sized without a REST query
+    ledger = userdata.Ledger(on_fill=userdata.print_fill)
+    ledger.load(client.get_account())
+    account = userdata.UserDataStream(client, ledger, user_stream).start()
     
     # Ensure the balance of the quote asset is large enough for purchase.
-    quote_bal = float(client.get_asset_balance(asset=QUOTE_ASSET)['free'])
+    quote_bal = fixedpoint.to_float(ledger.free.get(quote_asset, 0))
     if quote_bal < quote:
-        print(f"Error: Insufficient {QUOTE_ASSET} ({quote_bal} < {quote})")
+        print(f"Error: Insufficient {quote_asset} ({quote_bal} < {quote})")
         exit()
 
-    # Obtain a list of available coins for quote asset prematurely. This is done to avoid sending additional
+    # Load the exchange info prematurely (from disk while it is fresh). This is done to avoid sending additional
     # queries after pump command in order to speed up buying time.
-    assets = [sym["baseAsset"] for sym in client.get_exchange_info()["symbols"]
-                              if sym["quoteAsset"] == QUOTE_ASSET]
+    symbols = SymbolCache.load(client)
+    index = SymbolIndex.from_cache(symbols) # exact lookups, and suggestions for typos without the network
 
-    # Wait for pump command
+    # Wait for pump command, importing what the pump needs meanwhile
+    lazy.warm(*WARM)
     base_asset = input("Ready. Awaiting coin input (Base asset): ").strip().upper() # pump coin
+    buy_trace.stamp(latency.INPUT)
     
     # Only accept valid coins
-    while base_asset not in assets:
-        base_asset = input(f"Coin ${base_asset} does not exist. Try again: ").strip().upper() # pump coin
+    while index.lookup(base_asset, quote_asset) is None:
+        hint = index.hint(base_asset, quote_asset)
+        base_asset = input(f"Coin ${base_asset} does not exist{hint}. Try again: ").strip().upper() # pump coin
+        buy_trace.stamp(latency.INPUT)
     
-    symbol = f"{base_asset}{QUOTE_ASSET}" # exchange symbol
+    symbol = index.lookup(base_asset, quote_asset) # exchange symbol
+    buy_trace.stamp(latency.RESOLVED)
 
     # Timings
     pump_buy_t0 = now() # ms
-    pump_sell_t0 = pump_buy_t0 + args.wait * 1000 # ms
 
-    buy_filled = False
-
-    # Place order at market value using a balance quote
-    try:
-        order = client.order_market_buy(symbol=symbol,
-                                        newOrderRespType=ORDER_RESP_TYPE_FULL,
-                                        quoteOrderQty=quote)
-        if order["status"] == "FILLED":
-            fills = order["fills"]
-            fills_num = len(fills)
+    # Record every tick to disk as it arrives
+    recorder = tickrec.TickRecorder(f"{pump_buy_t0}.ticks")
 
-            executedQty = float(order["executedQty"])
-            order_buy = sum(float(fill["price"]) * float(fill["qty"]) for fill in fills)
-            order_buy_price = order_buy / executedQty
+    asyncio.run(pump())
 
-            pump_buy_t1 = order["transactTime"]
-            pump_buy_ms = pump_buy_t1 - pump_buy_t0 # Time taken to buy in ms
-            
-            s, ms = divmod(pump_buy_t1, 1000)
+    # stop keep-alive pings, clock syncs and the user data stream
+    connections.stop()
+    clock.stop()
+    print(limiter.report())
+    account.stop()
 
-            print("Bought {qty} {base} for {price} {asset} in {time} ms ({fills} fills @ {timestamp}.{ms:03d})".format(
-                qty=executedQty, base=base_asset, price=order_buy,
-                asset=QUOTE_ASSET, time=pump_buy_ms, fills=fills_num,
-                timestamp=time.strftime('%H:%M:%S', time.gmtime(s)), ms=ms))
+    # Persist the stage timings, 'python latency.py' prints the histograms across runs
+    print(latency.report([buy_trace, sell_trace]))
+    latency.save([buy_trace, sell_trace])
 
-            buy_filled = True
-        else:
-            print(f"Order has not been filled. Response:")
-            print(order)
-    except BinanceAPIException as e:
-        # error handling goes here
-        print(e)
-    except BinanceOrderException as e:
-        # error handling goes here
-        print(e)
-    finally:
-        pass
-    
-    if buy_filled:
-        # Init and start the WebSocket
-        bsm = BinanceSocketManager(client)
-        # Schedule a price update
-        conn_key = bsm.start_symbol_ticker_socket(symbol, fetch_price)
-        bsm.start()
-
-        symbol_info = client.get_symbol_info(symbol)
-
-        # ensure LOT_SIZE constraint passes
-        step_size = float(symbol_info['filters'][2]['stepSize'])
-        base_bal = float(client.get_asset_balance(asset=base_asset)['free'])
-        sell_qty = float(math.floor(base_bal * (1/step_size))) / (1/step_size)
-
-        # Loop each tick at a TPS rate
-        while (update := now()) < pump_sell_t0:
-
-#            # Update on progress
-#            if ((update - pump_buy_t1) / (args.wait * 1000)) % 10 < 1000:
-#                print("=", end="")
-
-            # If sell factor triggering is enabled, schedule a price update
-            # and monitor the sell factor increase
-            if order_last_price and sf_crit != 0:
-                
-                # Monitor the sell factor increase
-                with sync_lock:
-                    sf = order_last_price / order_buy_price
-                    if sf >= sf_crit:
-                        break
-
-            time.sleep(1/TPS)
-        
-        pump_sell_t0 = int(round(time.time() * 1000)) # ms
-        
-        # Sell as soon as either condition is reached
-        try:
-            order = client.order_market_sell(symbol=symbol,
-                                             newOrderRespType=ORDER_RESP_TYPE_FULL,
-                                             quantity=sell_qty)
-            if order["status"] == "FILLED":
-                fills = order["fills"]
-                fills_num = len(fills)
-
-                executedQty = float(order["executedQty"])
-                sell = sum(float(fill["price"]) * float(fill["qty"]) for fill in fills)
-                sell_price = sell / executedQty
-
-                pump_sell_t1 = order["transactTime"]
-                pump_sell_ms = pump_sell_t1 - pump_sell_t0 # Time taken to buy in ms
-                
-                s, ms = divmod(pump_sell_t1, 1000)
-
-                print("Sold {qty} {base} for {price} {asset} in {time} ms ({fills} fills @ {timestamp}.{ms:03d})".format(
-                    qty=executedQty, base=base_asset, price=sell,
-                    asset=QUOTE_ASSET, time=pump_sell_ms, fills=fills_num,
-                    timestamp=time.strftime('%H:%M:%S', time.gmtime(s)), ms=ms))
-                
-                print("Profit: {:.4f}%".format(100 * (sell - order_buy) / order_buy))
-
-                sell_filled = True
-            else:
-                print(f"Order has not been filled. Response:")
-                print(order)
-        except BinanceAPIException as e:
-            # error handling goes here
-            print(e)
-        except BinanceOrderException as e:
-            # error handling goes here
-            print(e)
-        finally:
-            pass
-        
-        # stop websocket
-        bsm.stop_socket(conn_key)
-
-        # properly terminate WebSocket
-        reactor.stop()
-
-        # Save price history to file
-        with open(f"{now()}.csv", 'w') as csv_file:
-            csv_writer = csv.writer(csv_file)
-            with sync_lock:
-                for tick in price_history:
-                    csv_writer.writerow([tick, price_history[tick]])
\ No newline at end of file
+    # Price history is already on disk, optionally convert it for analysis
+    recorder.close()
+    print(f"Recorded {recorder.count} ticks to '{recorder.path}'")
+    if args.csv:
+        print(f"Generated '{tickrec.to_csv(recorder.path)}'")
\ No newline at end of file
@@ -1,16 +1,33 @@
 import os  # OS Util funcs
 import time  # Timing
 import json  # JSON
-import math  # math utils funcs
+import asyncio  # event loop
 import argparse  # Command parser
-import threading  # multithreading
 
 # python-binance lib
-from binance.client import Client
-from twisted.internet import reactor
-from binance.websockets import BinanceSocketManager
 from binance.exceptions import BinanceAPIException, BinanceOrderException
 
+import lazy
+import exitrules
+import orderbook
+import latency
+import fixedpoint
+from journal import Journal, LogSink
+from ingest import TickerFilter
+from engine import Engine, call, ticker_stream, depth_stream, user_stream
+from symbolcache import SymbolCache
+from symbolindex import SymbolIndex
+from ratelimit import RateLimiter
+
+# heavy modules load on first use, so -h and argument errors return at once
+binance_client = lazy.module("binance.client")  # requests and dateparser
+connpool = lazy.module("connpool")
+clocksync = lazy.module("clocksync")
+userdata = lazy.module("userdata")
+ordertemplate = lazy.module("ordertemplate")
+tickstore = lazy.module("tickstore")  # numpy
+WARM = ("tickstore",)  # only needed once the coin is known, imported while it is typed
+
 # keys
 TEST_DEV_KEY_FILE = "test-dev-key.json"  # test framework keys
 DEV_KEY_FILE = "dev-key.json"  # dev key file
@@ -20,10 +37,18 @@ DEV_KEY_SECRET = "secret-key"  # secret-key identifier
 # GLOBAL
 # set up parameters for websocket
 cur_price = 0  # initialise most recent price returned by websocket to some value
-pct_dev = 1.0  # deviation in percentage increase
-# set up extra parameters
-sold = False
-timer_transaction = None
+ticks = None  # rolling price statistics, allocated at the entry
+pct_dev = 1.0  # tolerance on the percentage increase, the sell triggers this much below --pct
+clock = None  # exchange clock tracker, the local clock is used until it is set
+ledger = None  # balances and fills pushed by the user data stream
+buy_time = None  # exchange time of the buy fill, ms
+buy_template = None  # buy request built ahead of the coin input
+sell_template = None  # sell request built ahead of the quantity
+journal = None  # run journal, written in the background
+log = None  # console output of the tick handler, written in the background
+# hot path stage timings
+buy_trace = latency.Trace("buy")
+sell_trace = latency.Trace("sell")
 
 
 def get_keys(test=False):
@@ -87,74 +112,155 @@ def input_keys():
 
 def update_price(msg):
     """
-        callback function
+        tick handler
 
         process incoming WebSocket price update for SHT/BTC trades:
             - calculate the percentage increase from the buy price
-            - sell if percentage increase above args.pct
+            - sell once an exit rule triggers
+
+        :return: reason to sell, or None to keep holding
+    """
+    global cur_price
+    new_price = float(msg['c'])  # current price
+    ticks.append(msg['E'] / 1000, new_price, float(msg['Q']))  # every tick at its event time, for the rolling statistics
+    log.log("new price: %s", new_price)
+    if new_price == cur_price:
+        return  # new trade had the same price as previous trade
+    log.log("price for calc: %s", new_price)
+    pct_increase = ((new_price - buy_price) / buy_price) * 100.0
+    log.log("pct_increase: %s", pct_increase)
+    cur_price = new_price
+    return rules.update(new_price, now() / 1000)
+
+
+def now():
+    """
+        current time in ms, on the exchange clock once it is synced
     """
-    global sold, cur_price, pct_dev
-    if not sold:
-        if msg['e'] != 'error':
-            new_price = float(msg['c'])  # current price
-            print(f"new price: {new_price}")
-            if new_price == cur_price:
-                return  # new trade had the same price as previous trade
-            print(f"price for calc: {new_price}")
-            pct_increase = ((new_price - buy_price) / buy_price) * 100.0
-            print(f"pct_increase: {pct_increase}")
-            if (pct_increase + pct_dev >= pct) or (pct_increase - pct_dev >= pct):
-                # percentage increase reached
-                sell("percentage increase reached")
-                return
-            cur_price = new_price
+    return int(clock.now() if clock else time.time() * 1000)
 
 
-def sell(reason):
+async def buy():
     """
-        sell all SHT coins in wallet for BTC
+        buy SHT coins with a balance quote of BTC at market value
 
-        set sold flag to true
-        cancel the timer
+        set the weighted average buy price
+        exit if the order is not filled
     """
-    global sold, timer_transaction
-    if sold:
-        return
+    global buy_price, buy_time
 
-    # ensure LOT_SIZE constraint passes
-    step_size = float(symbol_info['filters'][2]['stepSize'])
-    coin_amt = float(client.get_asset_balance(asset=coin)['free'])
-    coin_amt = float(math.floor(coin_amt * (1/step_size))) / (1/step_size)
+    # buy time in ms
+    pump_buy_t0 = now()
 
-    pump_sell_t1 = int(time.time() * 1000)  # ms
+    # Place order at market value using a balance quote
+    buy_order = None
+    try:
+        buy_order = await call(latency.traced(buy_trace, buy_template.fire), symbol=symbol)
+        journal.log("buy", symbol=symbol, order=buy_order)
+    except BinanceAPIException as e:
+        print(e)
+    except BinanceOrderException as e:
+        print(e)
+    # real buy case
+    if buy_order is not None and buy_order["status"] == "FILLED":
+        buy_time = buy_order["transactTime"]
+        pump_buy_ms = buy_time - pump_buy_t0  # Time taken to buy in ms
+        executedQty = buy_order["executedQty"]
+        # get weighted average buy price for order
+        buy_price = fixedpoint.to_float(fixedpoint.Fills(buy_order).vwap)
+        buy_trace.stamp(latency.FILLED)
+        buy_trace.server_time(buy_order["transactTime"])
+        print(f"Bought {executedQty} {coin} in {pump_buy_ms} ms for {buy_price} BTC per {coin}.")
+    else:
+        print(f"Order has not been filled. Response:")
+        print(buy_order)
+        exit(1)
+
+
+async def sell_quantity(wait=True):
+    """
+        size the sell from the SHT balance after the buy, while the price is watched,
+        waiting for the user data stream (if `wait`) before querying the balance
+
+        :return: LOT_SIZE valid quantity string
+    """
+    # ensure LOT_SIZE constraint passes, rounded exactly in fixed point
+    precision = fixedpoint.Precision.of(symbols, symbol)
+    coin_units = await userdata.balance(ledger, coin, buy_time, userdata.FILL_TIMEOUT if wait else 0)  # pushed by the user data stream
+    if coin_units is None:
+        print("no account update for the buy yet, querying the balance")
+        coin_units = fixedpoint.units((await call(client.get_asset_balance, asset=coin))['free'])
+    return precision.quantity(coin_units)
 
+
+async def sell(coin_amt, reason, book):
+    """
+        sell `coin_amt` SHT coins (the whole balance) for BTC
+
+        log the fill expected from the local order book next to the actual one
+    """
+    pump_sell_t1 = now()  # ms
+    expected = book.estimate_sell(float(coin_amt)) if book.ready else None
+
+    sell_order = None
     try:
-        sell_order = client.create_order(symbol=symbol,
-                                         side="SELL",
-                                         type="MARKET",
-                                         quantity=coin_amt)
-        with open("sell-order-response.json", 'w') as f:
-            json.dump(sell_order, f, indent=4)
-            print(f"Generated sell-order-response.json")
+        sell_order = await call(latency.traced(sell_trace, sell_template.fire), symbol=symbol, quantity=coin_amt)
+        journal.log("sell", symbol=symbol, order=sell_order, reason=reason, quantity=coin_amt,
+                    expected=expected._asdict() if expected else None)
     except BinanceAPIException as e:
         print(e)
     except BinanceOrderException as e:
         print(e)
 
-    if 'sell_order' in locals() and sell_order["status"] == "FILLED":
+    if sell_order is not None and sell_order["status"] == "FILLED":
         pump_sell_ms = sell_order["transactTime"] - pump_sell_t1  # Time taken to sell in ms
         executedQty = sell_order["executedQty"]
-        sell_price = sum([float(fill['qty']) * float(fill['price']) for fill in sell_order['fills']])
+        sell_price = fixedpoint.Fills(sell_order).total
+        sell_trace.stamp(latency.FILLED)
+        sell_trace.server_time(sell_order["transactTime"])
         print(f"Sold {executedQty} {coin} in {pump_sell_ms} ms for {sell_price} BTC due to {reason}.")
-        sold = True
-        if timer_transaction is not None:
-            timer_transaction.cancel()
+        if expected:
+            print(orderbook.describe(expected, coin, "BTC"))
     else:
         print(f"Order has not been filled. Response:")
         print(sell_order)
         exit(1)
 
 
+async def pump():
+    """
+        buy, then sell as soon as any exit rule triggers (percentage increase, time delay, ...)
+    """
+    global ticks
+    # subscribe to the ticker while the buy order is in flight
+    # only the fields update_price reads are cut out of the frames, every tick is kept for the rolling statistics
+    engine = Engine(ticker_stream(symbol, decode=TickerFilter()), clock).start()
+    # mirror the order book to estimate the fill of the sell
+    book = orderbook.OrderBook(symbol)
+    bought = asyncio.Event()  # the snapshot waits for the buy
+    book_task = asyncio.create_task(orderbook.maintain(book, client, depth_stream(symbol), after=bought))
+    sizing = None
+    try:
+        await buy()
+        bought.set()
+        rules.start(buy_price, buy_time / 1000)  # the --wait deadline runs from the fill
+        ticks = tickstore.TickBuffer()  # fresh at the entry, allocated off the buy path
+        sizing = asyncio.create_task(sell_quantity())  # every tick is checked against the rules meanwhile
+        reason = await engine.watch(update_price, rules.deadline, since=buy_time)  # ticks from the fill on
+        sell_trace.stamp(latency.DECISION)
+        journal.log("decision", symbol=symbol, reason=reason, price=cur_price)
+        # a lagging user data stream never holds up the sell, the balance is queried instead
+        coin_amt = sizing.result() if sizing.done() else await sell_quantity(wait=False)
+        await sell(coin_amt, reason, book)
+        print(f"price at the decision: {ticks.describe()}")
+    finally:
+        # stop websockets
+        if sizing is not None:
+            sizing.cancel()
+        book_task.cancel()
+        await engine.close()
+
+
 if __name__ == "__main__":
     # parse program arguments
     parser = argparse.ArgumentParser(description='Pump n dump automated bot')
@@ -163,6 +269,7 @@ if __name__ == "__main__":
                         help="Time to wait between buy and sell, in seconds")
     parser.add_argument("--pct", type=str, default='10000.0', required=False,
                         help="Percentage increase from buy price at which to sell")
+    parser.add_argument("--exit", type=str, default=None, required=False, help=exitrules.HELP)
     args = parser.parse_args()
 
     # get public and private keys
@@ -173,73 +280,80 @@ if __name__ == "__main__":
     pct = float(args.pct)
     pump_btc = float(args.btc)
 
+    # sell after --wait, at --pct, or at whichever extra exit rule triggers first
+    rules = exitrules.parse(args.exit)
+    rules.add(exitrules.Deadline(args.wait))
+    rules.add(exitrules.TakeProfit(1 + (pct - pct_dev) / 100))
+    print(f"Exit rules: {rules}")
+
+    # every order response and decision of the run goes to its journal, 'python journal.py' lists the runs
+    journal = Journal(script="pympA", btc=pump_btc, pct=pct, wait=args.wait, exit=args.exit)
+    print(f"Journal: {journal.path}")
+    log = LogSink()
+
     # create new client obj
-    client = Client(public_key, private_key)
+    client = binance_client.Client(public_key, private_key)
     print("Session initiated with Binance API")
     # client.API_URL = "https://testnet.binance.vision/api"  # for testing
 
-    # get BTC balance and assert there is enough in account
-    btc_acc_amt = round(float(client.get_asset_balance(asset="BTC")['free']), 8)
-    assert btc_acc_amt >= pump_btc, "ERROR: insufficient BTC funds in account, specify a smaller value for --btc"
+    # keep the connections to the API open while waiting for the pump, so the buy skips the handshake
+    connections = connpool.ConnectionManager(client).start()
+    print(connections.report())
 
-    # Wait for pump command
-    coin = input("Ready. Awaiting coin symbol input:").upper().strip()  # pump coin
-    symbol = f"{coin}BTC"  # exchange symbol
-    while client.get_symbol_info(symbol) is None:
-        print("ERROR: inputted coin symbol is wrong!!!")
-        coin = input("Re-enter coin symbol:").upper().strip()
-        symbol = f"{coin}BTC"  # exchange symbol
-    symbol_info = client.get_symbol_info(symbol)
+    # track the exchange clock, so orders are signed with its time and deadlines and timings are measured on it
+    clock = clocksync.ClockSync(client).start()
+    clock.attach(client)
+    print(clock.report())
 
-    # debug
-    with open("symbol-info-response.json", 'w') as f:
-        json.dump(symbol_info, f, indent=4)
-        print(f"Generated symbol-info-response.json")
+    # track the request weight and order count limits, orders get the budget first
+    limiter = RateLimiter()
+    limiter.attach(client)
 
-    # buy time in ms
-    pump_buy_t0 = int(time.time() * 1000)
+    # time every stage the orders go through
+    latency.instrument(client)
 
-    # Place order at market value using a balance quote
-    try:
-        buy_order = client.create_order(symbol=symbol,
-                                        side="BUY",
-                                        type="MARKET",
-                                        quoteOrderQty=pump_btc)  # change to create_order and use quoteOrderQty=
-        with open("buy-order-response.json", 'w') as f:
-            json.dump(buy_order, f, indent=4)
-            print(f"Generated buy-order-response.json")
-    except BinanceAPIException as e:
-        print(e)
-    except BinanceOrderException as e:
-        print(e)
-    # real buy case
-    if 'buy_order' in locals() and buy_order["status"] == "FILLED":
-        pump_buy_ms = buy_order["transactTime"] - pump_buy_t0  # Time taken to buy in ms
-        executedQty = buy_order["executedQty"]
-        # get weighted average buy price for order
-        total_qty = sum([float(fill['qty']) for fill in buy_order['fills']])
-        buy_price = round(sum([float(fill['qty']) * float(fill['price']) for fill in buy_order['fills']]) / total_qty, 8)
-        print(f"Bought {executedQty} {coin} in {pump_buy_ms} ms for {buy_price} BTC per {coin}.")
+    # build the orders up front, so the trigger only fills in the symbol (and quantity) and signs
+    buy_template = ordertemplate.market_buy(client, pump_btc, clock)
+    sell_template = ordertemplate.market_sell(client, clock)
 
-        filled = True
-    else:
-        print(f"Order has not been filled. Response:")
-        print(buy_order)
-        exit(1)
+    # follow balances and fills through the user data stream, so the sell is sized without a REST query
+    ledger = userdata.Ledger(on_fill=userdata.print_fill)
+    ledger.load(client.get_account())
+    account = userdata.UserDataStream(client, ledger, user_stream).start()
+
+    # get BTC balance and assert there is enough in account
+    btc_acc_amt = fixedpoint.to_float(ledger.free.get("BTC", 0))
+    assert btc_acc_amt >= pump_btc, "ERROR: insufficient BTC funds in account, specify a smaller value for --btc"
 
-    # bought successfully
-    if filled:
-        # initialise WebSocket for price polling
-        bsm = BinanceSocketManager(client)
-        conn_key = bsm.start_symbol_ticker_socket(symbol, update_price)
-        # start the WebSocket
-        bsm.start()
-
-        # sell either when percentage increase is reached or time delay is reached, whichever comes first
-        timer_transaction = threading.Timer(args.wait, sell, ["timer expiry"])
-        timer_transaction.start()
-        timer_transaction.join()
-
-        # stop websocket
-        bsm.stop_socket(conn_key)
-        reactor.stop()  # properly terminate WebSocket
+    # load exchange info before the pump so no metadata is queried after the coin is entered
+    symbols = SymbolCache.load(client)
+    index = SymbolIndex.from_cache(symbols)  # exact lookups, and suggestions for typos without the network
+
+    # Wait for pump command, importing what the pump needs meanwhile
+    lazy.warm(*WARM)
+    coin = input("Ready. Awaiting coin symbol input:").upper().strip()  # pump coin
+    buy_trace.stamp(latency.INPUT)
+    symbol = index.lookup(coin, "BTC")  # exchange symbol
+    while symbol is None:
+        print(f"ERROR: inputted coin symbol is wrong!!!{index.hint(coin, 'BTC')}")
+        coin = input("Re-enter coin symbol:").upper().strip()
+        buy_trace.stamp(latency.INPUT)
+        symbol = index.lookup(coin, "BTC")  # exchange symbol
+    symbol_info = symbols.get(symbol)
+    buy_trace.stamp(latency.RESOLVED)
+
+    journal.log("symbol_info", symbol=symbol, info=symbol_info)
+
+    asyncio.run(pump())
+
+    # stop keep-alive pings, clock syncs and the user data stream
+    connections.stop()
+    clock.stop()
+    print(limiter.report())
+    account.stop()
+    journal.close()
+    log.close()
+
+    # persist the stage timings, 'python latency.py' prints the histograms across runs
+    print(latency.report([buy_trace, sell_trace]))
+    latency.save([buy_trace, sell_trace])
@@ -0,0 +1,126 @@
+import sys  # exit status
+import json  # JSON
+import time  # Timing
+import socket  # control socket
+import argparse  # Command parser
+
+SOCKET_PATH = "pymp.sock"  # same default as daemon.py, which is not imported to keep this client instant
+COMMANDS = """Commands:
+  <COIN> [quote]   buy COIN with quote (default: the daemon's) of the quote asset,
+                   COIN/ASSET (e.g. DOGE/ETH 0.5) buys with another quote asset
+  sell <COIN>      sell a position now
+  status           open positions, latency histograms and connection reports
+  quit             stop the daemon (open positions are left as they are)
+  exit             leave this prompt, the daemon keeps running"""
+
+
+class Control:
+    """ Connection to a running daemon.py: one JSON line out, one JSON line back. """
+
+    def __init__(self, path=SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.reader = self.sock.makefile('rb')
+
+    def request(self, cmd, **fields):
+        """ :return: (reply, round trip in ms) """
+
+        line = json.dumps({"cmd": cmd, **{k: v for k, v in fields.items() if v is not None}}).encode('utf-8') + b"\n"
+        t0 = time.perf_counter()
+        self.sock.sendall(line)
+        reply = self.reader.readline()
+        elapsed = (time.perf_counter() - t0) * 1000
+        if not reply:
+            raise ConnectionError("daemon closed the connection")
+        return json.loads(reply), elapsed
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def show(reply, elapsed):
+    """ Print a reply, the latencies measured by the daemon and the round trip measured here. """
+
+    if not reply.pop("ok"):
+        print(f"Error: {reply.pop('error')}")
+    spans = reply.pop("latency", None)
+    for key in ("positions", "reports"):
+        value = reply.pop(key, None)
+        if value:
+            print("\n".join(value) if isinstance(value, list) else value)
+    if reply:
+        print(", ".join(f"{key}: {value}" for key, value in reply.items()))
+    if spans and isinstance(next(iter(spans.values())), dict):  # status histograms
+        print(f"{'interval':<32} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name, h in spans.items():
+            print(f"{name:<32} {h['count']:>6} {h['p50']:>9.3f} {h['p90']:>9.3f} {h['p99']:>9.3f} {h['p100']:>9.3f}")
+    elif spans:
+        print("\n".join(f"{name}: {value:.3f} ms" for name, value in spans.items()))
+    print(f"(round trip {elapsed:.3f} ms)")
+
+
+def interactive(control):
+    """ Prompt for commands over one connection, like session.py but against the daemon. """
+
+    print(COMMANDS)
+    while True:
+        try:
+            words = input("> ").split()
+        except EOFError:
+            break
+        if not words:
+            continue
+        command = words[0].lower()
+        if command == "exit":
+            break
+        elif command in ("quit", "status") and len(words) == 1:
+            show(*control.request(command))
+            if command == "quit":
+                break
+        elif command == "sell" and len(words) == 2:
+            show(*control.request("sell", coin=words[1]))
+        elif len(words) <= 2:
+            try:
+                quote = float(words[1]) if len(words) == 2 else None
+            except ValueError:
+                print(f"Invalid amount '{words[1]}'")
+                continue
+            show(*control.request("buy", coin=words[0], quote=quote))
+        else:
+            print(COMMANDS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Send commands to a running daemon.py, or prompt for them without a command')
+    parser.add_argument("--socket", type=str, default=SOCKET_PATH, required=False, help=f"Control socket path (default {SOCKET_PATH})")
+    commands = parser.add_subparsers(dest="cmd")
+    buy = commands.add_parser("buy", help="buy a coin and watch it with exit rules")
+    buy.add_argument("coin", type=str, help="Base asset, or COIN/ASSET for another quote asset")
+    buy.add_argument("--quote", type=float, default=None, required=False, help="Amount of the quote asset to buy with (default: the daemon's)")
+    buy.add_argument("--quote_asset", type=str, default=None, required=False, help="Quote asset (default: the daemon's)")
+    buy.add_argument("--wait", type=float, default=None, required=False, help="Time to wait between buy and sell, in seconds (default: the daemon's)")
+    buy.add_argument("--exit", type=str, default=None, required=False, help="Exit rules, e.g. tp=1.5,trail=5 (default: the daemon's)")
+    sell = commands.add_parser("sell", help="sell a position now")
+    sell.add_argument("coin", type=str, help="Base asset, or COIN/ASSET for another quote asset")
+    commands.add_parser("status", help="open positions, latency histograms and connection reports")
+    commands.add_parser("quit", help="stop the daemon")
+    args = parser.parse_args()
+
+    try:
+        control = Control(args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"Error: no daemon listening on '{args.socket}', start one with 'python daemon.py'")
+        sys.exit(1)
+
+    try:
+        if args.cmd is None:
+            interactive(control)
+        else:
+            fields = {key: value for key, value in vars(args).items() if key not in ("cmd", "socket")}
+            reply, elapsed = control.request(args.cmd, **fields)
+            ok = reply["ok"]
+            show(reply, elapsed)
+            sys.exit(0 if ok else 1)
+    finally:
+        control.close()
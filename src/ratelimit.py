@@ -0,0 +1,207 @@
+import time  # Timing
+import threading  # shared between the loop's executor threads
+from urllib.parse import urlparse
+
+WEIGHT_HEADER = "x-mbx-used-weight-1m"
+# header reporting the server's count of each limit -> (limit, window in s), spot API defaults
+LIMITS = {
+    WEIGHT_HEADER: (6000, 60),
+    "x-mbx-order-count-10s": (100, 10),
+    "x-mbx-order-count-1d": (200000, 86400),
+}
+RESERVE = 0.2  # share of the weight budget informational calls leave to orders
+BAN_WAIT = 60  # seconds to wait after a 429/418 without Retry-After
+ORDER_PATH = "/v3/order"
+STATIC_PATHS = ("/v3/exchangeInfo",)  # metadata that may be answered from the last response (symbol info reads it too)
+# request weight per endpoint, anything else weighs 1
+WEIGHTS = {
+    "/v3/exchangeInfo": 20,
+    "/v3/account": 20,
+    "/v3/myTrades": 20,
+    "/v3/allOrders": 20,
+    "/v3/openOrders": 6,
+    "/v3/ticker/24hr": 2,
+    "/v3/ticker/price": 2,
+    "/v3/userDataStream": 2,
+}
+DEPTH_PATH = "/v3/depth"
+DEPTH_LIMIT = 100  # levels per side when the request gives no limit
+# order book snapshot weight by its limit -> (up to levels, weight)
+DEPTH_WEIGHTS = ((100, 5), (500, 25), (1000, 50), (5000, 250))
+
+
+class TokenBucket:
+    """
+        Model of one exchange limit: `limit` tokens refilled evenly over `interval`
+        seconds. The server counts in fixed windows, so its reported usage replaces
+        the model's whenever it is higher.
+    """
+
+    def __init__(self, limit, interval):
+        self.limit = limit
+        self.rate = limit / interval  # tokens per s
+        self.tokens = float(limit)
+        self.t = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self.t) * self.rate)
+        self.t = now
+
+    def delay(self, cost, floor=0.):
+        """ Seconds until `cost` tokens can be taken with `floor` tokens left. """
+
+        self.refill()
+        return max(0., (cost + floor - self.tokens) / self.rate)
+
+    def take(self, cost):
+        self.tokens -= cost
+
+    def sync(self, used):
+        """ Account for the server's count of the current window. """
+
+        self.refill()
+        self.tokens = min(self.tokens, self.limit - used)
+
+    @property
+    def used(self):
+        return self.limit - self.tokens
+
+
+def weight(path, params=None):
+    """ Request weight of an endpoint, e.g. "/api/v3/account", and of an order book snapshot by its limit. """
+
+    if path.endswith(DEPTH_PATH):
+        limit = int((params or {}).get("limit", DEPTH_LIMIT))
+        return next((cost for levels, cost in DEPTH_WEIGHTS if limit <= levels), DEPTH_WEIGHTS[-1][1])
+    for endpoint, cost in WEIGHTS.items():
+        if path.endswith(endpoint):
+            return cost
+    return 1
+
+
+class RateLimiter:
+    """
+        Single scheduler of every REST request of a `Client`, against token bucket
+        models of the request weight and order count limits.
+
+        Orders may spend the whole budget and go first: informational calls (balance,
+        exchange info, symbol info, ...) leave `reserve` of the weight to them and wait
+        while an order is waiting. Static metadata (exchange and symbol info) is answered
+        with its last response instead of waiting when there is one; account, balance
+        and depth calls always wait for a fresh answer. The used-weight and order-count headers of every
+        response, whoever sent it, resync the models, and a 429/418 holds back every
+        request until its Retry-After.
+    """
+
+    def __init__(self, limits=None, reserve=RESERVE):
+        self.buckets = {header: TokenBucket(*limit) for header, limit in (limits or LIMITS).items()}
+        self.weight = self.buckets[WEIGHT_HEADER]
+        self.orders = [bucket for header, bucket in self.buckets.items() if header != WEIGHT_HEADER]
+        self.floor = reserve * self.weight.limit  # weight informational calls never spend
+        self.lock = threading.Condition()
+        self.waiting = 0  # orders waiting for the budget
+        self.banned_until = 0.  # monotonic s
+        self.cache = {}  # static metadata request -> last response
+        self.deferred = 0  # informational calls that waited
+        self.cached = 0  # metadata calls answered from the cache
+        self.bans = 0
+
+    def delay(self, cost, order):
+        """ Seconds until a request of weight `cost` may go, None while it must wait for a waiting order. """
+
+        if not order and self.waiting:
+            return None
+        delay = max(self.banned_until - time.monotonic(), self.weight.delay(cost, 0. if order else self.floor))
+        if order:
+            delay = max([delay] + [bucket.delay(1) for bucket in self.orders])
+        return delay
+
+    def available(self, cost):
+        """ Whether an informational call of weight `cost` could go right away. """
+
+        with self.lock:
+            delay = self.delay(cost, False)
+            return delay is not None and delay <= 0
+
+    def acquire(self, cost=1, order=False):
+        """
+            Block until a request of weight `cost` fits the limits and take it from the budget.
+
+            :return: seconds waited
+        """
+        t0 = time.monotonic()
+        waited = False
+        with self.lock:
+            if order:
+                self.waiting += 1
+            try:
+                while True:
+                    delay = self.delay(cost, order)
+                    if delay is not None and delay <= 0:
+                        break
+                    self.lock.wait(delay)
+                    waited = True
+                self.weight.take(cost)
+                if order:
+                    for bucket in self.orders:
+                        bucket.take(1)
+            finally:
+                if order:
+                    self.waiting -= 1
+                    self.lock.notify_all()
+        if waited and not order:
+            self.deferred += 1
+        return time.monotonic() - t0 if waited else 0.
+
+    def on_response(self, response, *args, **kwargs):
+        """ requests response hook: resync the models with the server's counts, hold back on a ban. """
+
+        with self.lock:
+            for header, bucket in self.buckets.items():
+                used = response.headers.get(header)
+                if used is not None:
+                    bucket.sync(int(used))
+            if response.status_code in (418, 429):
+                self.bans += 1
+                retry_after = response.headers.get("Retry-After")
+                self.banned_until = time.monotonic() + (int(retry_after) if retry_after else BAN_WAIT)
+            self.lock.notify_all()
+        return response
+
+    def attach(self, client):
+        """
+            Route every request of a python-binance `Client` through the scheduler.
+            Order templates built afterwards pick it up too.
+        """
+        request = client._request
+
+        def scheduled(method, uri, signed, force_params=False, **kwargs):
+            path = urlparse(uri).path
+            if path.endswith(ORDER_PATH) and method != 'get':
+                self.acquire(weight(path), order=True)
+                return request(method, uri, signed, force_params, **kwargs)
+
+            data = kwargs.get('data') or {}
+            key = (method, path, tuple(sorted((k, str(v)) for k, v in data.items() if k not in ('timestamp', 'signature'))))
+            cost = weight(path, data)
+            static = method == 'get' and path.endswith(STATIC_PATHS)
+            if static and key in self.cache and not self.available(cost):
+                self.cached += 1
+                return self.cache[key]
+            self.acquire(cost)
+            response = request(method, uri, signed, force_params, **kwargs)
+            if static:
+                self.cache[key] = response
+            return response
+
+        client._request = scheduled
+        client.session.hooks['response'].append(self.on_response)
+        client.rate_limiter = self
+        return client
+
+    def report(self):
+        with self.lock:
+            usage = ", ".join(f"{header[len('x-mbx-'):]} {bucket.used:.0f}/{bucket.limit}"
+                              for header, bucket in self.buckets.items())
+        return f"Rate limits: {usage}; {self.deferred} calls deferred, {self.cached} served from cache, {self.bans} bans"
@@ -0,0 +1,302 @@
+import os  # OS Util funcs
+import glob  # recording discovery
+import time  # Timing
+import math  # inf
+import argparse  # Command parser
+import itertools  # parameter grid
+
+import numpy as np
+
+import exitrules
+import tickrec
+
+SLIPPAGE = 0.001  # price impact of a market order, as a ratio
+FEE = 0.001  # taker fee per side, as a ratio
+LATENCY_MS = 50  # decision to fill delay
+
+
+def find_recordings(paths):
+    """ Expand files and directories of recordings (.ticks or .csv) into a sorted list of files. """
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.ticks")))
+            files.extend(glob.glob(os.path.join(path, "*.csv")))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def load(path):
+    """ (times in s since the first tick, prices) of a tick recording or of a `<ms>.csv` price history. """
+
+    if path.endswith(".ticks"):
+        ticks = tickrec.read(path)
+        timestamps, prices = ticks["timestamp"], ticks["price"]
+    else:
+        data = np.loadtxt(path, delimiter=",", ndmin=2, dtype=np.float64, usecols=(0, 1))  # (0, 2) when empty
+        timestamps, prices = data[:, 0], data[:, 1]
+    if not len(prices):
+        return np.empty(0), np.empty(0)
+    return (timestamps - timestamps[0]) / 1000, prices
+
+
+class Runs:
+    """
+        Recorded runs padded into (runs, ticks) arrays, so every run is evaluated at once.
+
+        Times are seconds since the first tick of a run, which is also the entry. Ticks
+        past the end of a run are NaN, and NaN never satisfies a comparison.
+    """
+
+    ARRAYS = ("lengths", "times", "prices", "entry")  # everything `Crossings.evaluate` reads
+
+    def __init__(self, names, series):
+        self.names = names
+        self.lengths = np.array([len(prices) for _, prices in series], dtype=np.int64)
+        width = int(self.lengths.max(initial=0))
+        self.times = np.full((len(series), width), np.nan)
+        self.prices = np.full((len(series), width), np.nan)
+        for i, (times, prices) in enumerate(series):
+            self.times[i, :len(times)] = times
+            self.prices[i, :len(prices)] = prices
+        self.rows = np.arange(len(series))
+
+        # parameter independent parts of the rules, shared by every evaluation
+        self.entry = self.prices[:, 0].copy()
+        self.ratio = self.prices / self.entry[:, None]
+        self.peak = np.fmax.accumulate(np.nan_to_num(self.prices, nan=-np.inf), axis=1)
+
+    @classmethod
+    def from_arrays(cls, names, arrays):
+        """ Runs over arrays already laid out as `ARRAYS`, e.g. views of shared memory, without copying them. """
+
+        runs = cls.__new__(cls)
+        runs.names = names
+        for key in cls.ARRAYS:
+            setattr(runs, key, arrays[key])
+        runs.rows = np.arange(len(names))
+        return runs
+
+    @classmethod
+    def load(cls, paths):
+        names, series = [], []
+        for path in find_recordings(paths):
+            times, prices = load(path)
+            if len(prices):
+                names.append(path)
+                series.append((times, prices))
+        return cls(names, series)
+
+    def __len__(self):
+        return len(self.names)
+
+    def run(self, i):
+        """ (times, prices) of run `i`, without padding. """
+
+        n = self.lengths[i]
+        return self.times[i, :n], self.prices[i, :n]
+
+
+def fill_pnl(entry, exit_price, slippage, fee):
+    """ Return of buying at `entry` and selling at `exit_price` with market orders, as a ratio. """
+
+    return exit_price * (1 - slippage) / (entry * (1 + slippage)) * (1 - fee) ** 2 - 1
+
+
+class Crossings:
+    """
+        Tick of the first crossing of every threshold of a parameter grid, per run, so a
+        combination is evaluated with a few O(runs) gathers instead of passes over the
+        padded (runs, ticks) arrays.
+
+        The running max of the price ratio and the running mins of the ratio and of the
+        price over its peak are monotonic, so all the thresholds of a rule are found in
+        a run with one `searchsorted`. So are the fills `latency_ms` after each tick and
+        after each deadline.
+    """
+
+    ARRAYS = ("tp", "trail", "dd", "tick_fill", "deadline_fill")  # everything `evaluate` reads besides the runs
+
+    def __init__(self, runs, waits=(math.inf,), tps=(math.inf,), trails=(None,), dds=(None,), latency_ms=LATENCY_MS):
+        self.runs = runs
+        self.values = {"wait": list(waits), "tp": list(tps), "trail": list(trails), "dd": list(dds)}
+        self.columns = {key: {value: j for j, value in enumerate(values)} for key, values in self.values.items()}
+
+        # nondecreasing per run from the tick after the entry on, the entry tick never triggers
+        rise = runs.ratio.copy()
+        slump = -runs.prices / runs.peak
+        fall = -runs.ratio
+        for running in (rise, slump, fall):
+            running[:, 0] = -np.inf
+            np.fmax.accumulate(running, axis=1, out=running)
+
+        # the searched values, None (rule off) is never reached
+        tps = np.array(self.values["tp"], dtype=np.float64)
+        trails = np.array([np.inf if v is None else v / 100 - 1 for v in self.values["trail"]], dtype=np.float64)
+        dds = np.array([np.inf if v is None else v / 100 - 1 for v in self.values["dd"]], dtype=np.float64)
+        waits = np.array(self.values["wait"], dtype=np.float64) + latency_ms / 1000
+
+        self.tp = np.empty((len(runs), len(tps)), dtype=np.int64)
+        self.trail = np.empty((len(runs), len(trails)), dtype=np.int64)
+        self.dd = np.empty((len(runs), len(dds)), dtype=np.int64)
+        self.tick_fill = np.zeros(runs.times.shape, dtype=np.int64)
+        self.deadline_fill = np.empty((len(runs), len(waits)), dtype=np.int64)
+        for i, n in enumerate(runs.lengths.tolist()):
+            times = runs.times[i, :n]
+            self.tp[i] = np.searchsorted(rise[i, :n], tps)
+            self.trail[i] = np.searchsorted(slump[i, :n], trails)
+            self.dd[i] = np.searchsorted(fall[i, :n], dds)
+            self.tick_fill[i, :n] = np.searchsorted(times, times + latency_ms / 1000, side="right") - 1
+            self.deadline_fill[i] = np.searchsorted(times, waits, side="right") - 1
+
+        # never crossed: decided at the end of the recording
+        last = (runs.lengths - 1)[:, None]
+        for crossed in (self.tp, self.trail, self.dd):
+            np.minimum(crossed, last, out=crossed)
+
+    @classmethod
+    def from_arrays(cls, runs, values, arrays):
+        """ Crossings over arrays already laid out as `ARRAYS`, e.g. views of shared memory, without copying them. """
+
+        crossings = cls.__new__(cls)
+        crossings.runs = runs
+        crossings.values = values
+        crossings.columns = {key: {value: j for j, value in enumerate(column)} for key, column in values.items()}
+        for key in cls.ARRAYS:
+            setattr(crossings, key, arrays[key])
+        return crossings
+
+    def evaluate(self, wait=math.inf, tp=math.inf, trail=None, dd=None, slippage=SLIPPAGE, fee=FEE):
+        """
+            Vectorized counterpart of `exitrules.ExitRules` over every run at once, for
+            values of the grid.
+
+            A tick-triggered exit is decided at that tick; the deadline is decided at
+            `wait` seconds exactly, like the engine's timer. Either way the simulated
+            fill is at the last price known `latency_ms` after the decision.
+
+            :return: (pnl ratios, decision times in s) per run
+        """
+        runs, columns = self.runs, self.columns
+        first = np.minimum(np.minimum(self.tp[:, columns["tp"][tp]], self.trail[:, columns["trail"][trail]]),
+                           self.dd[:, columns["dd"][dd]])
+        crossed = runs.times[runs.rows, first]
+        on_tick = crossed < wait
+        decided = np.where(on_tick, crossed, wait)
+        filled = np.where(on_tick, self.tick_fill[runs.rows, first], self.deadline_fill[:, columns["wait"][wait]])
+        return fill_pnl(runs.entry, runs.prices[runs.rows, filled], slippage, fee), decided
+
+
+def evaluate(runs, wait=math.inf, tp=math.inf, trail=None, dd=None,
+             slippage=SLIPPAGE, fee=FEE, latency_ms=LATENCY_MS):
+    """ `Crossings.evaluate` of a single combination. Build the `Crossings` of the whole grid once to sweep it. """
+
+    return Crossings(runs, [wait], [tp], [trail], [dd], latency_ms).evaluate(wait, tp, trail, dd, slippage, fee)
+
+
+def replay(times, prices, rules, slippage=SLIPPAGE, fee=FEE, latency_ms=LATENCY_MS):
+    """
+        Stream a single run tick by tick through the live exit rules, as fast as possible.
+
+        :return: (pnl ratio, decision time in s, reason, ns spent per rule update)
+    """
+    rules.start(prices[0], times[0])
+    update_ns = []
+    decided, reason = times[-1], "end of recording"
+    for t, price in zip(times[1:].tolist(), prices[1:].tolist()):
+        if t >= rules.deadline:
+            decided, reason = rules.deadline, exitrules.Deadline.reason
+            break
+        t0 = time.perf_counter_ns()
+        hit = rules.update(price, t)
+        update_ns.append(time.perf_counter_ns() - t0)
+        if hit:
+            decided, reason = t, hit
+            break
+
+    filled = np.searchsorted(times, decided + latency_ms / 1000, side="right") - 1
+    return fill_pnl(prices[0], prices[filled], slippage, fee), decided, reason, update_ns
+
+
+def grid(spec, cast=float):
+    """ Values of a grid spec: "5,10,30" or "start:stop:step" (stop inclusive). """
+
+    if not spec:
+        return []
+    if ":" in spec:
+        start, stop, step = map(float, spec.split(":"))
+        return [cast(v) for v in np.arange(start, stop + step / 2, step)]
+    return [cast(v) for v in spec.split(",")]
+
+
+def summarize(pnl, decided):
+    """ PnL distribution (in %) and mean hold time of one parameter combination. """
+
+    pct = 100 * pnl
+    p5, p50, p95 = np.percentile(pct, (5, 50, 95))
+    return {
+        "mean": pct.mean(),
+        "p5": p5,
+        "p50": p50,
+        "p95": p95,
+        "win": 100 * (pnl > 0).mean(),
+        "hold": decided.mean(),
+    }
+
+
+def print_table(rows, top):
+    """ Print parameter combinations ranked by mean PnL. """
+
+    print(f"{'wait':>7} {'tp':>7} {'trail':>7} {'dd':>7} | {'mean %':>8} {'p5 %':>8} {'p50 %':>8} {'p95 %':>8} {'win %':>7} {'hold s':>7}")
+    for params, stats in sorted(rows, key=lambda row: -row[1]["mean"])[:top]:
+        cols = " ".join(f"{'-' if v is None or math.isinf(v) else f'{v:g}':>7}" for v in params)
+        print(f"{cols} | {stats['mean']:>8.3f} {stats['p5']:>8.3f} {stats['p50']:>8.3f} {stats['p95']:>8.3f} "
+              f"{stats['win']:>7.1f} {stats['hold']:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay recorded price histories through the exit rules')
+    parser.add_argument("paths", nargs="+", help="tick recordings (.ticks), price histories (<ms>.csv) or directories of them")
+    parser.add_argument("--wait", type=str, default=None, required=True, help="Grid of --wait values in s, e.g. 5,10,30 or 5:60:5")
+    parser.add_argument("--sf", type=str, default=None, required=False, help="Grid of sell factors (sell price/buy price)")
+    parser.add_argument("--pct", type=str, default=None, required=False, help="Grid of percentage increases at which to sell")
+    parser.add_argument("--trail", type=str, default=None, required=False, help="Grid of trailing stops, in %% below the running max")
+    parser.add_argument("--dd", type=str, default=None, required=False, help="Grid of max drawdowns, in %% below the buy price")
+    parser.add_argument("--slippage", type=float, default=SLIPPAGE, required=False, help="Slippage per market order, as a ratio")
+    parser.add_argument("--fee", type=float, default=FEE, required=False, help="Fee per side, as a ratio")
+    parser.add_argument("--latency", type=float, default=LATENCY_MS, required=False, help="Decision to fill delay, in ms")
+    parser.add_argument("--top", type=int, default=20, required=False, help="Number of combinations to print")
+    args = parser.parse_args()
+
+    runs = Runs.load(args.paths)
+    assert len(runs), "ERROR: no recordings found"
+
+    # take profit ratios from both the sell factor and the percentage increase forms
+    tps = grid(args.sf) + [1 + pct / 100 for pct in grid(args.pct)] or [math.inf]
+    combos = list(itertools.product(grid(args.wait), tps, grid(args.trail) or [None], grid(args.dd) or [None]))
+    print(f"Replaying {len(runs)} runs ({runs.lengths.sum()} ticks) over {len(combos)} parameter combinations")
+
+    t0 = time.perf_counter()
+    crossings = Crossings(runs, *map(set, zip(*combos)), args.latency)
+    rows = [(combo, summarize(*crossings.evaluate(*combo, args.slippage, args.fee))) for combo in combos]
+    elapsed = time.perf_counter() - t0
+    print(f"Evaluated in {elapsed:.3f} s ({len(combos) * len(runs) / elapsed:.0f} runs/s)\n")
+    print_table(rows, args.top)
+
+    # Replay the best combination tick by tick through the live rules for decision latency
+    (wait, tp, trail, dd), _ = max(rows, key=lambda row: row[1]["mean"])
+    update_ns = []
+    for i in range(len(runs)):
+        rules = exitrules.ExitRules([exitrules.Deadline(wait)])
+        if not math.isinf(tp):
+            rules.add(exitrules.TakeProfit(tp))
+        if trail is not None:
+            rules.add(exitrules.TrailingStop(trail))
+        if dd is not None:
+            rules.add(exitrules.MaxDrawdown(dd))
+        update_ns.extend(replay(*runs.run(i), rules, args.slippage, args.fee, args.latency)[3])
+    if update_ns:
+        print("\nDecision latency of the live rules (best combination): p50 {:.2f} us, p99 {:.2f} us over {} ticks".format(
+            np.percentile(update_ns, 50) / 1000, np.percentile(update_ns, 99) / 1000, len(update_ns)))
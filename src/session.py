@@ -0,0 +1,354 @@
+import os  # OS Util funcs
+import math  # math utils funcs
+import json  # JSON
+import time  # Timing
+import asyncio  # event loop
+import argparse  # Command parser
+from array import array  # compact position columns
+
+# python-binance lib
+from binance.exceptions import BinanceAPIException, BinanceOrderException
+
+import lazy
+import exitrules
+import latency
+import fixedpoint
+from engine import CombinedStream, call
+from symbolcache import SymbolCache
+from symbolindex import SymbolIndex
+from ratelimit import RateLimiter
+
+# heavy modules load on first use, so -h and argument errors return at once
+binance_client = lazy.module("binance.client")  # requests and dateparser
+connpool = lazy.module("connpool")
+clocksync = lazy.module("clocksync")
+ordertemplate = lazy.module("ordertemplate")  # requests
+tickstore = lazy.module("tickstore")  # numpy
+WARM = ("tickstore",)  # only needed once a position is open, imported while the first command is typed
+
+DEV_KEY_FILE = "dev-key.json"  # dev key file
+DEV_KEY_API = "api-key"  # api-key identifier
+DEV_KEY_SECRET = "secret-key"  # secret-key identifier
+QUOTE_ASSET = "BTC"
+
+COMMANDS = """Commands:
+  <COIN> [quote]   buy COIN with quote (default --quote) of the quote asset and watch it,
+                   COIN/ASSET (e.g. DOGE/ETH 0.5) buys with another quote asset
+  sell <COIN>      sell a position now (COIN/ASSET for another quote asset)
+  list             print the open positions
+  quit             stop (open positions are left as they are)"""
+
+
+class PositionTable:
+    """
+        Open positions, one slot each, as parallel `array('d')` columns plus a symbol
+        to slot index.
+
+        The slot of a closed position is reused by the next one, so the columns only
+        grow to the peak number of concurrent positions, and a tick updates its slot in
+        place without allocating.
+    """
+
+    def __init__(self):
+        self.slots = {}  # symbol -> slot
+        self.symbols = []  # slot -> symbol, None when free
+        self.rules = []  # slot -> ExitRules
+        self.free = []  # free slots
+        self.qty = array('d')  # base asset held
+        self.entry = array('d')  # weighted average buy price
+        self.spent = array('d')  # quote asset spent
+        self.last = array('d')  # last price seen
+        self.opened = array('d')  # buy time, s
+
+    def add(self, symbol, qty, entry, spent, opened, rules):
+        if self.free:
+            slot = self.free.pop()
+            self.symbols[slot], self.rules[slot] = symbol, rules
+            self.qty[slot], self.entry[slot], self.spent[slot] = qty, entry, spent
+            self.last[slot], self.opened[slot] = entry, opened
+        else:
+            slot = len(self.symbols)
+            self.symbols.append(symbol)
+            self.rules.append(rules)
+            self.qty.append(qty)
+            self.entry.append(entry)
+            self.spent.append(spent)
+            self.last.append(entry)
+            self.opened.append(opened)
+        self.slots[symbol] = slot
+        return slot
+
+    def remove(self, symbol):
+        slot = self.slots.pop(symbol)
+        self.symbols[slot], self.rules[slot] = None, None
+        self.free.append(slot)
+
+    def __contains__(self, symbol):
+        return symbol in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        return iter(list(self.slots))
+
+    def describe(self, symbol, t):
+        slot = self.slots[symbol]
+        return "{symbol}: {qty:g} @ {entry:.8f}, last {last:.8f} ({pnl:+.2f}%), held {held:.1f} s, {rules}".format(
+            symbol=symbol, qty=self.qty[slot], entry=self.entry[slot], last=self.last[slot],
+            pnl=100 * (self.last[slot] / self.entry[slot] - 1), held=t - self.opened[slot], rules=self.rules[slot])
+
+
+class SessionManager:
+    """
+        Long lived counterpart of a pymp.py run: any number of positions across any
+        number of symbols, with one client, one REST connection pool and one combined
+        ticker stream whose subscriptions follow the open positions.
+
+        Every ticker message goes to the exit rules of its position, and every
+        deadline is a loop timer. Whichever triggers first sells that position only.
+
+        Orders of different positions run concurrently on executor threads, so they are
+        fired from order templates, each call sending its own copy of a prepared request:
+        `Client` calls keep the last response on the shared client, where one order
+        could read another's.
+    """
+
+    def __init__(self, client, symbols, stream, clock=None, quote_asset=QUOTE_ASSET, template=None):
+        self.client = client
+        template = template or ordertemplate.OrderTemplate
+        self.buy_template = ordertemplate.market_buy(client, None, clock, template)  # fired with the symbol and quote amount
+        self.sell_template = ordertemplate.market_sell(client, clock, template)
+        self.symbols = symbols  # SymbolCache
+        self.index = SymbolIndex.from_cache(symbols)
+        self.stream = stream  # CombinedStream
+        self.time = clock.time if clock is not None else time.time
+        self.quote_asset = quote_asset
+        self.table = PositionTable()
+        self.timers = {}  # symbol -> deadline timer
+        self.ticks = {}  # symbol -> rolling price statistics
+        self.closing = set()  # symbols with a sell in flight
+        self.tasks = set()  # running sells
+        self.reader = None
+
+    def start(self):
+        """ Start consuming the stream. Must be called inside the loop. """
+
+        if self.reader is None:
+            self.reader = asyncio.create_task(self.read())
+        return self
+
+    async def read(self):
+        async for msg in self.stream:
+            if msg.get("e") == "24hrTicker":
+                self.on_tick(msg)
+
+    def on_tick(self, msg):
+        symbol = msg["s"]
+        slot = self.table.slots.get(symbol)
+        if slot is None or symbol in self.closing:
+            return
+        price = float(msg["c"])
+        self.table.last[slot] = price
+        reason = self.table.rules[slot].update(price, self.time())
+        if reason:
+            self.schedule_sell(symbol, reason)
+        self.ticks[symbol].append(msg["E"] / 1000, price, float(msg["Q"]))
+
+    def schedule_sell(self, symbol, reason, trace=None):
+        """ Start selling `symbol`, returns the task or None if it is already being sold (or not held). """
+
+        if symbol in self.closing or symbol not in self.table:
+            return None
+        self.closing.add(symbol)
+        task = asyncio.create_task(self.sell(symbol, reason, trace))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def buy(self, base_asset, quote_qty, rules, quote_asset=None, trace=None):
+        """
+            Buy `base_asset` with `quote_qty` of `quote_asset` (the session's by default) at market value
+            and watch it with `rules`. The request stages are stamped on `trace`, if given.
+
+            :return: the order, or None if it was not filled
+        """
+        quote_asset = quote_asset or self.quote_asset
+        symbol = self.index.lookup(base_asset, quote_asset)
+        assert symbol is not None, f"ERROR: {base_asset}/{quote_asset} does not exist"
+        assert symbol not in self.table, f"ERROR: already holding {symbol}"
+
+        # Subscribe while the order is in flight
+        stream_name = f"{symbol.lower()}@ticker"
+        await self.stream.subscribe(stream_name)
+
+        order = None
+        try:
+            order = await call(latency.traced(trace, self.buy_template.fire), symbol=symbol, quoteOrderQty=quote_qty)
+        except (BinanceAPIException, BinanceOrderException) as e:
+            print(e)
+        except BaseException:
+            await self.stream.unsubscribe(stream_name)  # request errors are the caller's to report
+            raise
+        if order is None or order["status"] != "FILLED":
+            if order is not None:
+                print(f"Order has not been filled. Response:\n{order}")
+            await self.stream.unsubscribe(stream_name)
+            return None
+
+        fills = fixedpoint.Fills(order)
+        if trace is not None:
+            trace.stamp(latency.FILLED)
+        spent = fills.total
+        executed_qty = fills.executed
+
+        # ensure LOT_SIZE constraint passes, rounded exactly in fixed point
+        precision = fixedpoint.Precision.of(self.symbols, symbol)
+        held = fixedpoint.to_float(precision.floor_qty(fills.qty - fills.commission(base_asset)))
+
+        t = self.time()
+        rules.start(spent / executed_qty, t)
+        self.table.add(symbol, held, spent / executed_qty, spent, t, rules)
+        self.ticks[symbol] = tickstore.TickBuffer()
+        if not math.isinf(rules.deadline):
+            self.timers[symbol] = asyncio.get_running_loop().call_later(
+                max(0., rules.deadline - t), self.schedule_sell, symbol, exitrules.Deadline.reason)
+
+        print(f"Bought {executed_qty} {base_asset} for {spent:.8f} {quote_asset} ({fills.count} fills), "
+              f"{len(self.table)} open positions")
+        return order
+
+    async def sell(self, symbol, reason, trace=None):
+        """ Sell the whole position in `symbol` at market value. It is kept open if the order fails. """
+
+        slot = self.table.slots[symbol]
+        quantity = fixedpoint.Precision.of(self.symbols, symbol).quantity(fixedpoint.from_float(self.table.qty[slot]))
+        order = None
+        try:
+            order = await call(latency.traced(trace, self.sell_template.fire), symbol=symbol, quantity=quantity)
+        except (BinanceAPIException, BinanceOrderException) as e:
+            print(e)
+        finally:
+            self.closing.discard(symbol)
+
+        if order is None or order["status"] != "FILLED":
+            if order is not None:
+                print(f"Order has not been filled. Response:\n{order}")
+            return None
+
+        timer = self.timers.pop(symbol, None)
+        if timer is not None:
+            timer.cancel()
+        proceeds = fixedpoint.Fills(order).total
+        if trace is not None:
+            trace.stamp(latency.FILLED)
+        spent = self.table.spent[slot]
+        self.table.remove(symbol)
+        del self.ticks[symbol]
+        await self.stream.unsubscribe(f"{symbol.lower()}@ticker")
+
+        print(f"Sold {order['executedQty']} {symbol} for {proceeds:.8f} {self.symbols.get(symbol)['quoteAsset']} due to {reason}. "
+              f"Profit: {100 * (proceeds - spent) / spent:.4f}%, {len(self.table)} open positions")
+        return order
+
+    def report(self):
+        if not len(self.table):
+            return "No open positions"
+        t = self.time()
+        return "\n".join(f"{self.table.describe(symbol, t)}\n  {self.ticks[symbol].describe()}" for symbol in self.table)
+
+    async def close(self):
+        """ Stop watching. Open positions are left as they are. """
+
+        for timer in self.timers.values():
+            timer.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.reader is not None:
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+            self.reader = None
+
+
+async def run(session, quote_qty, make_rules):
+    """ Read commands from stdin until quit. """
+
+    session.start()
+    print(COMMANDS)
+    try:
+        while True:
+            words = (await call(input, "> ")).split()
+            if not words:
+                continue
+            command = words[0].lower()
+            if command == "quit":
+                break
+            elif command == "list":
+                print(session.report())
+            elif command == "sell" and len(words) == 2:
+                symbol = session.index.lookup(*session.index.parse(words[1], session.quote_asset))
+                if symbol in session.table:
+                    session.schedule_sell(symbol, "manual sell")
+                else:
+                    print(f"Not holding {words[1].upper()}")
+            elif len(words) <= 2:
+                base_asset, quote_asset = session.index.parse(words[0], session.quote_asset)
+                symbol = session.index.lookup(base_asset, quote_asset)
+                if symbol is None:
+                    print(f"Coin ${base_asset} does not exist{session.index.hint(base_asset, quote_asset)}")
+                elif symbol in session.table:
+                    print(f"Already holding {symbol}")
+                elif len(words) == 1 and quote_asset != session.quote_asset:
+                    print(f"Give the amount of {quote_asset} to buy {base_asset} with")
+                else:
+                    try:
+                        amount = float(words[1]) if len(words) == 2 else quote_qty
+                    except ValueError:
+                        print(f"Invalid amount '{words[1]}'")
+                        continue
+                    await session.buy(base_asset, amount, make_rules(), quote_asset)
+            else:
+                print(COMMANDS)
+    finally:
+        await session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Watch many pump positions at once over a single connection')
+    parser.add_argument("--quote", type=float, default=None, required=True, help="default amount of the quote asset to buy each coin with")
+    parser.add_argument("--wait", type=int, default=0, required=True, help="Time to wait between buy and sell, in seconds")
+    parser.add_argument("--exit", type=str, default=None, required=False, help=exitrules.HELP)
+    parser.add_argument("--quote_asset", type=str, default=QUOTE_ASSET, required=False, help=f"Default quote asset, e.g. BTC, ETH or USDT (default {QUOTE_ASSET})")
+    args = parser.parse_args()
+
+    assert args.wait != 0, "ERROR: Must specify a non zero value for --wait, use 'python session.py -h' for help"
+    assert os.path.exists(DEV_KEY_FILE), f"ERROR: '{DEV_KEY_FILE}' not found, run 'python pymp.py' to generate it"
+    with open(DEV_KEY_FILE, 'r') as f:
+        keys = json.loads(f.read())
+
+    # Each position gets its own rule state, built from the same spec
+    def make_rules():
+        return exitrules.parse(args.exit).add(exitrules.Deadline(args.wait))
+    print(f"Exit rules: {make_rules()}")
+
+    client = binance_client.Client(keys[DEV_KEY_API], keys[DEV_KEY_SECRET])
+    connections = connpool.ConnectionManager(client).start()
+    print(connections.report())
+    clock = clocksync.ClockSync(client).start()
+    clock.attach(client)
+    print(clock.report())
+    limiter = RateLimiter()  # orders get the request weight budget first
+    limiter.attach(client)
+    symbols = SymbolCache.load(client)
+
+    session = SessionManager(client, symbols, CombinedStream(), clock, args.quote_asset.upper())
+    lazy.warm(*WARM)
+    asyncio.run(run(session, args.quote, make_rules))
+
+    connections.stop()
+    clock.stop()
+    print(limiter.report())
+    print(session.report())
@@ -0,0 +1,146 @@
+import os  # OS Util funcs
+import json  # JSON
+import time  # Timing
+import math  # inf
+import hashlib  # sweep identity
+import argparse  # Command parser
+import itertools  # parameter grid
+from multiprocessing import shared_memory  # tick arrays shared with the workers
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import replay
+
+SWEEP_DIR = "sweeps"  # one sweep-<key>.jsonl of results per set of recordings and fill model
+TASKS_PER_WORKER = 4  # combinations are split in this many tasks per worker, to even out the load
+
+crossings = None  # worker side: Crossings over the shared arrays
+blocks = []  # shared memory blocks, kept open while their arrays are in use
+
+
+def share(grid):
+    """
+        Copy the arrays `replay.Crossings.evaluate` reads, its own and its runs', into shared memory.
+
+        :return: (blocks, layout), layout is {(owner, array): (block name, shape, dtype)} for `attach`
+    """
+    blocks, layout = [], {}
+    for owner, keys in (("runs", replay.Runs.ARRAYS), ("crossings", replay.Crossings.ARRAYS)):
+        for key in keys:
+            array = getattr(grid.runs if owner == "runs" else grid, key)
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            blocks.append(block)
+            layout[owner, key] = (block.name, array.shape, array.dtype.str)
+    return blocks, layout
+
+
+def attach(names, values, layout):
+    """ Worker initializer: Crossings over read-only views of the shared arrays, nothing is copied or pickled per task. """
+
+    global crossings
+    arrays = {"runs": {}, "crossings": {}}
+    for (owner, key), (name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        array = arrays[owner][key] = np.ndarray(shape, dtype, buffer=block.buf)
+        array.flags.writeable = False
+    crossings = replay.Crossings.from_arrays(replay.Runs.from_arrays(names, arrays["runs"]), values, arrays["crossings"])
+
+
+def evaluate(combos, slippage, fee):
+    """ Worker task: summaries of a chunk of (wait, tp, trail, dd) combinations over every run. """
+
+    return [(combo, replay.summarize(*crossings.evaluate(*combo, slippage, fee))) for combo in combos]
+
+
+def sweep_key(paths, slippage, fee, latency_ms):
+    """ Identity of a sweep's inputs: the recordings (path, size, mtime) and the fill model. """
+
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+    digest.update(f"{slippage}:{fee}:{latency_ms}".encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def load_results(path):
+    """ {combination: stats} already in a sweep file. A line cut short by an interruption is left out. """
+
+    results = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                results[tuple(row["params"])] = row["stats"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sweep exit rule parameters over recorded price histories on every core')
+    parser.add_argument("paths", nargs="+", help="tick recordings (.ticks), price histories (<ms>.csv) or directories of them")
+    parser.add_argument("--wait", type=str, default=None, required=True, help="Grid of --wait values in s, e.g. 5,10,30 or 5:60:5")
+    parser.add_argument("--sf", type=str, default=None, required=False, help="Grid of sell factors (sell price/buy price)")
+    parser.add_argument("--pct", type=str, default=None, required=False, help="Grid of percentage increases at which to sell")
+    parser.add_argument("--trail", type=str, default=None, required=False, help="Grid of trailing stops, in %% below the running max")
+    parser.add_argument("--dd", type=str, default=None, required=False, help="Grid of max drawdowns, in %% below the buy price")
+    parser.add_argument("--slippage", type=float, default=replay.SLIPPAGE, required=False, help="Slippage per market order, as a ratio")
+    parser.add_argument("--fee", type=float, default=replay.FEE, required=False, help="Fee per side, as a ratio")
+    parser.add_argument("--latency", type=float, default=replay.LATENCY_MS, required=False, help="Decision to fill delay, in ms")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), required=False, help="Worker processes (default: every core)")
+    parser.add_argument("--out", type=str, default=SWEEP_DIR, required=False, help="Directory of the sweep results, an interrupted sweep resumes from them")
+    parser.add_argument("--top", type=int, default=20, required=False, help="Number of combinations to print")
+    args = parser.parse_args()
+
+    files = replay.find_recordings(args.paths)
+    runs = replay.Runs.load(files)
+    assert len(runs), "ERROR: no recordings found"
+
+    # take profit ratios from both the sell factor and the percentage increase forms
+    tps = replay.grid(args.sf) + [1 + pct / 100 for pct in replay.grid(args.pct)] or [math.inf]
+    combos = list(itertools.product(replay.grid(args.wait), tps, replay.grid(args.trail) or [None], replay.grid(args.dd) or [None]))
+
+    # results are appended as they come in, so rerunning an interrupted sweep only evaluates what is missing
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"sweep-{sweep_key(files, args.slippage, args.fee, args.latency)}.jsonl")
+    results = load_results(path)
+    todo = [combo for combo in combos if combo not in results]
+    print(f"Sweeping {len(runs)} runs ({runs.lengths.sum()} ticks) over {len(combos)} parameter combinations, "
+          f"{len(combos) - len(todo)} already in '{path}', {args.workers} workers")
+
+    size = max(1, math.ceil(len(todo) / (args.workers * TASKS_PER_WORKER)))
+    t0 = time.perf_counter()
+    grid = replay.Crossings(runs, *map(set, zip(*combos)), args.latency)  # first crossings of every grid value, once
+    shared, layout = share(grid)
+    pool = ProcessPoolExecutor(args.workers, initializer=attach, initargs=(runs.names, grid.values, layout))
+    evaluated = 0
+    try:
+        with open(path, 'a') as f:
+            tasks = [pool.submit(evaluate, todo[i:i + size], args.slippage, args.fee)
+                     for i in range(0, len(todo), size)]
+            for task in as_completed(tasks):
+                chunk = task.result()
+                for combo, stats in chunk:
+                    results[combo] = stats
+                    f.write(json.dumps({"params": combo, "stats": stats}) + "\n")
+                f.flush()
+                evaluated += len(chunk)
+                print(f"\r{evaluated}/{len(todo)} combinations", end="", flush=True)
+    except KeyboardInterrupt:
+        print("\nInterrupted, run the same command again to resume")
+    finally:
+        pool.shutdown(cancel_futures=True)
+        for block in shared:
+            block.close()
+            block.unlink()
+
+    elapsed = time.perf_counter() - t0
+    if todo:
+        print(f"\nEvaluated in {elapsed:.3f} s ({evaluated * len(runs) / elapsed:.0f} runs/s)")
+    print()
+    replay.print_table([(combo, results[combo]) for combo in combos if combo in results], args.top)
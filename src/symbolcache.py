@@ -0,0 +1,84 @@
+import os  # OS Util funcs
+import time  # Timing
+import json  # JSON
+
+CACHE_FILE = "exchange-info.json"  # on-disk copy of the exchange info
+CACHE_TTL = 3600  # seconds before the on-disk copy is downloaded again
+
+
+class SymbolCache:
+    """
+        Exchange info loaded once at startup, keyed by symbol.
+
+        Filters of every symbol are indexed by `filterType`, so lookups such as the
+        LOT_SIZE step size never depend on the position of a filter in the list.
+    """
+
+    def __init__(self, symbols, timestamp):
+        self.symbols = symbols  # symbol -> symbol info, as returned by the exchange
+        self.timestamp = timestamp  # time the exchange info was downloaded, in s
+        self.filters = {symbol: {f["filterType"]: f for f in info["filters"]}
+                        for symbol, info in symbols.items()}
+
+    @classmethod
+    def load(cls, client, path=CACHE_FILE, ttl=CACHE_TTL):
+        """
+            Load the exchange info from `path` while it is younger than `ttl` seconds,
+            otherwise download it with `client` and persist it to `path`.
+
+            :return: SymbolCache
+        """
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    cached = json.load(f)
+                if time.time() - cached["timestamp"] < ttl:
+                    return cls(cached["symbols"], cached["timestamp"])
+            except (ValueError, KeyError):
+                pass  # corrupt or outdated cache file, download again
+
+        return cls.download(client, path)
+
+    @classmethod
+    def download(cls, client, path=CACHE_FILE):
+        """ Download the full exchange info and persist it to `path`. """
+
+        timestamp = time.time()
+        symbols = {sym["symbol"]: sym for sym in client.get_exchange_info()["symbols"]}
+        cache = cls(symbols, timestamp)
+        if path:
+            cache.save(path)
+        return cache
+
+    def save(self, path=CACHE_FILE):
+        """ Write the cache atomically, so a crash never leaves a half written file behind. """
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"timestamp": self.timestamp, "symbols": self.symbols}, f)
+        os.replace(tmp_path, path)
+
+    def get(self, symbol):
+        """ Symbol info of `symbol`, or None if it is not listed (same contract as `Client.get_symbol_info`). """
+
+        return self.symbols.get(symbol.upper())
+
+    def get_filter(self, symbol, filter_type):
+        """ Filter `filter_type` (e.g. "LOT_SIZE") of `symbol`, or None if the symbol does not have it. """
+
+        return self.filters.get(symbol.upper(), {}).get(filter_type)
+
+    def step_size(self, symbol):
+        """ LOT_SIZE step size of `symbol`. """
+
+        return float(self.get_filter(symbol, "LOT_SIZE")["stepSize"])
+
+    def tick_size(self, symbol):
+        """ PRICE_FILTER tick size of `symbol`. """
+
+        return float(self.get_filter(symbol, "PRICE_FILTER")["tickSize"])
+
+    def base_assets(self, quote_asset):
+        """ Set of base assets tradable against `quote_asset`. """
+
+        return {info["baseAsset"] for info in self.symbols.values() if info["quoteAsset"] == quote_asset}
@@ -0,0 +1,143 @@
+import json  # JSON
+import argparse  # Command parser
+from bisect import bisect_left  # prefix search
+
+from symbolcache import CACHE_FILE
+
+MAX_DISTANCE = 2  # edits (insert, delete, substitute, swap) a suggestion may be away from the input
+SUGGESTIONS = 5  # suggestions returned on a miss
+SEPARATORS = "/-_ "  # accepted between base and quote asset, e.g. "DOGE/BTC"
+
+
+def deletes(word, distance):
+    """ Every string obtained by deleting up to `distance` characters of `word`, `word` included. """
+
+    found = {word}
+    edge = {word}
+    for _ in range(distance):
+        edge = {w[:i] + w[i + 1:] for w in edge for i in range(len(w))} - found
+        found |= edge
+    return found
+
+
+def edit_distance(a, b):
+    """ Optimal string alignment distance: insertions, deletions, substitutions and adjacent swaps. """
+
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previous, before, current = current, previous, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+class SymbolIndex:
+    """
+        In-memory index of the tradable symbols, for resolving typed coins without
+        touching the network.
+
+        Exact lookups are a dict access by (base asset, quote asset). On a miss,
+        suggestions come from two structures built up front: a sorted list of base
+        assets for prefix matches (a truncated coin), and a deletion neighbourhood map
+        (SymSpell) where every base asset is filed under all the strings one or two
+        deletions away from it. The input's own deletions then land on every base
+        asset within two edits, which is confirmed with the true edit distance.
+    """
+
+    def __init__(self, symbols, max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.symbols = {}  # (base asset, quote asset) -> symbol
+        self.quotes = {}  # base asset -> quote assets
+        for info in symbols:
+            if info.get("status", "TRADING") != "TRADING":
+                continue
+            self.symbols[info["baseAsset"], info["quoteAsset"]] = info["symbol"]
+            self.quotes.setdefault(info["baseAsset"], set()).add(info["quoteAsset"])
+        self.quote_assets = sorted({quote for quotes in self.quotes.values() for quote in quotes}, key=len, reverse=True)
+
+        self.sorted = sorted(self.quotes)  # base assets, for prefix search
+        self.neighbours = {}  # deletion -> base assets
+        for base in self.quotes:
+            for key in deletes(base, max_distance):
+                self.neighbours.setdefault(key, set()).add(base)
+
+    @classmethod
+    def from_cache(cls, cache, max_distance=MAX_DISTANCE):
+        """ Index of the symbols of a `SymbolCache`. """
+
+        return cls(cache.symbols.values(), max_distance)
+
+    def lookup(self, base_asset, quote_asset):
+        """ Symbol trading `base_asset` against `quote_asset`, or None. """
+
+        return self.symbols.get((base_asset, quote_asset))
+
+    def parse(self, text, quote_asset=None):
+        """
+            (base asset, quote asset) of a typed coin, e.g. "doge", "DOGE/ETH" or "DOGEETH".
+            The quote asset defaults to `quote_asset`.
+        """
+        text = text.strip().upper()
+        for separator in SEPARATORS:
+            if separator in text:
+                base, quote = text.split(separator, 1)
+                return base.strip(), quote.strip()
+        if (text, quote_asset) not in self.symbols:
+            for quote in self.quote_assets:
+                base = text[:-len(quote)]
+                if text.endswith(quote) and (base, quote) in self.symbols:
+                    return base, quote
+        return text, quote_asset
+
+    def suggest(self, base_asset, quote_asset=None, limit=SUGGESTIONS):
+        """ Closest base assets to a mistyped `base_asset`, tradable against `quote_asset` (any if None). """
+
+        base_asset = base_asset.strip().upper()
+        candidates = {}  # base asset -> rank
+
+        def tradable(base):
+            return quote_asset is None or quote_asset in self.quotes[base]
+
+        for key in deletes(base_asset, self.max_distance):
+            for base in self.neighbours.get(key, ()):
+                if base not in candidates and tradable(base):
+                    distance = edit_distance(base_asset, base)
+                    if distance <= self.max_distance:
+                        candidates[base] = (distance, not base.startswith(base_asset), base)
+
+        i = bisect_left(self.sorted, base_asset)
+        while i < len(self.sorted) and self.sorted[i].startswith(base_asset) and base_asset:
+            base = self.sorted[i]
+            if tradable(base):
+                rank = (max(1, len(base) - len(base_asset)), False, base)
+                candidates[base] = min(candidates.get(base, rank), rank)
+            i += 1
+
+        return sorted(candidates, key=candidates.get)[:limit]
+
+    def hint(self, base_asset, quote_asset=None):
+        """ " (did you mean ...?)" for a prompt, or "" without suggestions. """
+
+        suggestions = self.suggest(base_asset, quote_asset)
+        if not suggestions:
+            return ""
+        return f" (did you mean {', '.join(suggestions)}?)"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Resolve coins against the cached exchange info, without the network')
+    parser.add_argument("coins", nargs="+", help="coins to resolve, e.g. DOGE, DOGE/ETH or DOGEETH")
+    parser.add_argument("--quote", type=str, default="BTC", required=False, help="Quote asset when the coin has none")
+    parser.add_argument("--file", type=str, default=CACHE_FILE, required=False, help="Exchange info cache")
+    args = parser.parse_args()
+
+    with open(args.file, 'r') as f:
+        index = SymbolIndex(json.load(f)["symbols"].values())
+
+    for coin in args.coins:
+        base, quote = index.parse(coin, args.quote.upper())
+        symbol = index.lookup(base, quote)
+        print(f"{coin}: {symbol}" if symbol else f"{coin}: no {base}/{quote}{index.hint(base, quote)}")
@@ -0,0 +1,92 @@
+import os  # OS Util funcs
+import csv  # CSV export
+import struct  # record packing
+import argparse  # Command parser
+
+MAGIC = b"PYMPTICK"  # file signature
+VERSION = 1
+RECORD = struct.Struct("<qdddd")  # timestamp (ms), price, bid, ask, volume
+HEADER = struct.Struct("<8sII")  # magic, version, record size
+FIELDS = ("timestamp", "price", "bid", "ask", "volume")
+
+
+class TickRecorder:
+    """
+        Append-only recorder of fixed-width tick records.
+
+        Every tick is packed into a reused buffer and written straight to the file
+        descriptor, so nothing is allocated per tick and everything recorded so far
+        survives a crash of the bot. Ticks sharing a millisecond are all kept.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if not exists:
+            os.write(self.fd, HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self.buffer = bytearray(RECORD.size)
+        self.count = 0
+
+    def write(self, timestamp, price, bid=0., ask=0., volume=0.):
+        RECORD.pack_into(self.buffer, 0, timestamp, price, bid, ask, volume)
+        os.write(self.fd, self.buffer)
+        self.count += 1
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def dtype():
+    """ NumPy structured dtype matching RECORD. """
+
+    import numpy as np
+    return np.dtype([("timestamp", "<i8"), ("price", "<f8"), ("bid", "<f8"), ("ask", "<f8"), ("volume", "<f8")])
+
+
+def read(path):
+    """
+        Zero-copy, read-only NumPy view of a recording, e.g. `read(path)["price"]`.
+        A record cut short by a crash is left out.
+    """
+    import numpy as np
+
+    with open(path, 'rb') as f:
+        magic, version, size = HEADER.unpack(f.read(HEADER.size))
+    assert magic == MAGIC and size == RECORD.size, f"ERROR: '{path}' is not a tick recording"
+
+    count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+    if count == 0:
+        return np.empty(0, dtype=dtype())
+    return np.memmap(path, dtype=dtype(), mode='r', offset=HEADER.size, shape=(count,))
+
+
+def to_csv(path, csv_path=None):
+    """ Convert a recording to CSV (timestamp, price, bid, ask, volume), returns the CSV path. """
+
+    csv_path = csv_path or f"{os.path.splitext(path)[0]}.csv"
+    with open(path, 'rb') as f:
+        f.seek(HEADER.size)
+        data = f.read()
+    data = data[:len(data) // RECORD.size * RECORD.size]  # drop a record cut short by a crash
+
+    with open(csv_path, 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(RECORD.iter_unpack(data))
+    return csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert tick recordings to CSV')
+    parser.add_argument("paths", nargs="+", help="tick recordings (.ticks)")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        print(f"Generated '{to_csv(path)}'")
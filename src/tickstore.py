@@ -0,0 +1,130 @@
+import math  # exp, inf
+from collections import deque
+
+import numpy as np
+
+CAPACITY = 65536  # ticks kept per symbol
+WINDOW = 5.  # seconds covered by the rolling statistics
+EMA_TAU = 1.  # seconds, time constant of the price EMA
+
+
+class TickBuffer:
+    """
+        Fixed capacity ring buffer of the ticks of one symbol, with rolling statistics
+        over the last `window` seconds kept up to date on every tick.
+
+        Rolling min/max come from monotonic deques of tick numbers, VWAP from running
+        sums that ticks leave as they fall out of the window, and the EMA is time
+        weighted, so every statistic is O(1) amortized to update and O(1) to read.
+
+        There is a single writer (the tick handler). A tick is written to the arrays
+        before `count` is bumped to publish it, so readers never take a lock and never
+        see a half written tick, as long as they read ticks younger than `capacity`.
+    """
+
+    def __init__(self, capacity=CAPACITY, window=WINDOW, ema_tau=EMA_TAU):
+        self.capacity = capacity
+        self.window = window
+        self.ema_tau = ema_tau
+        self.times = np.zeros(capacity)  # s
+        self.prices = np.zeros(capacity)
+        self.qtys = np.zeros(capacity)
+        self.count = 0  # ticks written so far, tick n lives at n % capacity
+        self.start = 0  # first tick inside the window
+
+        self.mins = deque()  # (tick number, price) of increasing prices, the window min first
+        self.maxs = deque()  # (tick number, price) of decreasing prices, the window max first
+        self.notional = 0.  # sum of price * qty inside the window
+        self.volume = 0.  # sum of qty inside the window
+        self.ema = math.nan
+        self.last = math.nan
+        self.last_t = math.nan
+
+        self.high = -math.inf  # max since `mark`
+        self.low = math.inf  # min since `mark`
+
+    def append(self, t, price, qty=0.):
+        n = self.count
+        i = n % self.capacity
+        if self.start <= n - self.capacity:
+            self.evict()  # the tick about to be overwritten is still inside the window
+        self.times[i], self.prices[i], self.qtys[i] = t, price, qty
+
+        # time weighted EMA, the weight of the previous value decays with the time since it
+        if n:
+            self.ema += (price - self.ema) * (1 - math.exp(-(t - self.last_t) / self.ema_tau))
+        else:
+            self.ema = price
+        self.last, self.last_t = price, t
+
+        mins, maxs = self.mins, self.maxs
+        while mins and mins[-1][1] >= price:
+            mins.pop()
+        mins.append((n, price))
+        while maxs and maxs[-1][1] <= price:
+            maxs.pop()
+        maxs.append((n, price))
+        self.notional += price * qty
+        self.volume += qty
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+
+        self.count = n + 1  # publish
+        expiry = t - self.window
+        while self.times[self.start % self.capacity] < expiry:
+            self.evict()
+
+    def evict(self):
+        """ Move the oldest tick out of the window. """
+
+        i = self.start % self.capacity
+        self.notional -= self.prices[i] * self.qtys[i]
+        self.volume -= self.qtys[i]
+        self.start += 1
+        if self.mins[0][0] < self.start:
+            self.mins.popleft()
+        if self.maxs[0][0] < self.start:
+            self.maxs.popleft()
+
+    def mark(self):
+        """ Restart the since-mark high and low, e.g. at the entry. """
+
+        self.high = -math.inf if math.isnan(self.last) else self.last
+        self.low = math.inf if math.isnan(self.last) else self.last
+
+    @property
+    def min(self):
+        return self.mins[0][1] if self.mins else math.nan
+
+    @property
+    def max(self):
+        return self.maxs[0][1] if self.maxs else math.nan
+
+    @property
+    def vwap(self):
+        return self.notional / self.volume if self.volume > 0 else math.nan
+
+    @property
+    def rate(self):
+        """ Ticks per second over the ticks inside the window. """
+
+        elapsed = self.last_t - self.times[self.start % self.capacity]
+        return (self.count - self.start - 1) / elapsed if elapsed > 0 else math.nan
+
+    def latest(self, n):
+        """ (times, prices, qtys) of the last `n` ticks, oldest first. Views unless they wrap around the ring. """
+
+        n = min(n, self.count, self.capacity)
+        end = self.count % self.capacity
+        if n <= end:
+            return self.times[end - n:end], self.prices[end - n:end], self.qtys[end - n:end]
+        split = self.capacity - (n - end)
+        return tuple(np.concatenate((a[split:], a[:end])) for a in (self.times, self.prices, self.qtys))
+
+    def describe(self):
+        return "last {last:.8f}, {window:g} s min {min:.8f} max {max:.8f} vwap {vwap:.8f}, ema {ema:.8f}, " \
+               "{rate:.1f} ticks/s, high {high:.8f} low {low:.8f}".format(
+                last=self.last, window=self.window, min=self.min, max=self.max, vwap=self.vwap,
+                ema=self.ema, rate=self.rate, high=self.high, low=self.low)
@@ -0,0 +1,178 @@
+import asyncio  # event loop
+import threading  # background stream
+
+import requests
+from binance.exceptions import BinanceAPIException
+
+import fixedpoint
+from engine import call, user_stream
+
+KEEPALIVE_INTERVAL = 30 * 60  # seconds, listen keys expire after 60 min without one
+FILL_TIMEOUT = 5  # seconds to wait for the account update of a fill
+TIMEOUT = 5  # seconds
+
+
+class Ledger:
+    """
+        In-memory balances and orders of the account, kept up to date by user data
+        stream events instead of REST queries.
+
+        Balances come from outboundAccountPosition and balanceUpdate events, orders and
+        their (partial) fills from executionReport events. Balances are kept in exact
+        integer units (1e-8) so a sell can be sized from them without float rounding.
+        Events are applied on the stream thread; `wait` lets another thread block until
+        a balance is known to include a given fill.
+    """
+
+    def __init__(self, on_fill=None):
+        self.free = {}  # asset -> free balance, units
+        self.locked = {}  # asset -> locked balance, units
+        self.updated = {}  # asset -> exchange time (ms) of the last update of its balance
+        self.orders = {}  # orderId -> order state
+        self.on_fill = on_fill  # called with the order state on every fill
+        self.condition = threading.Condition()
+
+    def load(self, account):
+        """ Seed the balances from a `Client.get_account` response. """
+
+        with self.condition:
+            for balance in account["balances"]:
+                self.free[balance["asset"]] = fixedpoint.units(balance["free"])
+                self.locked[balance["asset"]] = fixedpoint.units(balance["locked"])
+                self.updated.setdefault(balance["asset"], 0)
+
+    def apply(self, event):
+        kind = event.get("e")
+        if kind == "outboundAccountPosition":
+            with self.condition:
+                for balance in event["B"]:
+                    self.free[balance["a"]] = fixedpoint.units(balance["f"])
+                    self.locked[balance["a"]] = fixedpoint.units(balance["l"])
+                    self.updated[balance["a"]] = event["u"]
+                self.condition.notify_all()
+        elif kind == "balanceUpdate":
+            with self.condition:
+                self.free[event["a"]] = self.free.get(event["a"], 0) + fixedpoint.units(event["d"])
+                self.updated[event["a"]] = event["T"]
+                self.condition.notify_all()
+        elif kind == "executionReport":
+            order = self.orders.setdefault(event["i"], {
+                "symbol": event["s"], "side": event["S"], "fills": 0, "commission": {}})
+            order["status"] = event["X"]
+            order["executed"] = float(event["z"])
+            order["quote"] = float(event["Z"])
+            if event["x"] == "TRADE":
+                order["fills"] += 1
+                order["commission"][event["N"]] = order["commission"].get(event["N"], 0.) + float(event["n"])
+                if self.on_fill is not None:
+                    self.on_fill(order)
+
+    def balance(self, asset, since):
+        """ Free balance of `asset` in units if it has been updated at or after `since` (exchange ms), None otherwise. """
+
+        if self.updated.get(asset, -1) >= since:
+            return self.free.get(asset, 0)
+        return None
+
+    def wait(self, asset, since, timeout=FILL_TIMEOUT):
+        """ Block until the balance of `asset` has been updated at or after `since`. None on timeout. """
+
+        with self.condition:
+            self.condition.wait_for(lambda: self.updated.get(asset, -1) >= since, timeout)
+            return self.balance(asset, since)
+
+
+async def balance(ledger, asset, since, timeout=FILL_TIMEOUT):
+    """ `Ledger.wait` without blocking the event loop, and without leaving it when the balance is already known. """
+
+    free = ledger.balance(asset, since)
+    if free is None:
+        free = await call(ledger.wait, asset, since, timeout)
+    return free
+
+
+def describe(order):
+    return "{side} {symbol}: {status}, {executed:g} for {quote:.8f} over {fills} fills".format(**order)
+
+
+def print_fill(order):
+    """ `Ledger.on_fill` handler logging every (partial) fill. """
+
+    print(describe(order))
+
+
+class UserDataStream:
+    """
+        Feeds the user data stream of the account into a `Ledger`, from a background
+        thread with its own event loop, so it is connected before any order is placed.
+
+        The listen key is kept alive every `interval` seconds through the session
+        directly (like the keep-alive pings) and replaced when the exchange expires it.
+    """
+
+    def __init__(self, client, ledger, stream=user_stream, interval=KEEPALIVE_INTERVAL):
+        self.client = client
+        self.ledger = ledger
+        self.stream = stream  # (listen key, on_connect) -> async iterable of events
+        self.interval = interval
+        self.listen_key = None
+        self.connected = threading.Event()
+        self.loop = None
+        self.task = None
+        self.thread = None
+
+    def keepalive(self):
+        if hasattr(self.client, "session"):
+            self.client.session.put(f"{self.client.API_URL}/v3/userDataStream",
+                                    params={"listenKey": self.listen_key}, timeout=TIMEOUT).raise_for_status()
+        else:
+            self.client.stream_keepalive(self.listen_key)  # e.g. the mock client
+
+    async def keep_alive(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await call(self.keepalive)
+            except requests.RequestException as e:
+                print(f"User data stream keepalive failed: {e}")
+
+    async def run(self):
+        while True:
+            self.listen_key = await call(self.client.stream_get_listen_key)
+            keep_alive = asyncio.create_task(self.keep_alive())
+            try:
+                async for event in self.stream(self.listen_key, on_connect=self.connected.set):
+                    if event.get("e") == "listenKeyExpired":
+                        break  # get a new key
+                    self.ledger.apply(event)
+            finally:
+                keep_alive.cancel()
+
+    def start(self, timeout=TIMEOUT):
+        """ Start the stream thread and wait until it is connected. """
+
+        def main():
+            self.loop = asyncio.new_event_loop()
+            self.task = self.loop.create_task(self.run())
+            try:
+                self.loop.run_until_complete(self.task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self.loop.close()
+
+        self.thread = threading.Thread(target=main, daemon=True)
+        self.thread.start()
+        if not self.connected.wait(timeout):
+            print("User data stream not connected yet, balances may lag")
+        return self
+
+    def stop(self):
+        if self.task is not None:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+            self.thread.join(TIMEOUT)
+        if self.listen_key is not None:
+            try:
+                self.client.stream_close(self.listen_key)
+            except (requests.RequestException, BinanceAPIException) as e:
+                print(f"Could not close the user data stream: {e}")